@@ -0,0 +1,226 @@
+# aggregate.py
+"""
+Агрегация сегментов по корзинам: день, ISO-неделя, месяц, год,
+час суток.
+
+Сегменты один раз сворачиваются в плотные суммы по дням (group_sums,
+их держит ColumnStore из segment_store), а корзины крупнее дня
+собираются уже из дневных сумм (fold_days) — это проход по дням,
+а не по сегментам. Час суток в дневные суммы не попадает: его
+считает aggregate по самим сегментам, заодно со всеми календарными
+корзинами за тот же проход.
+"""
+
+from collections import namedtuple
+from datetime import date
+
+import numpy as np
+
+from constants import ACTIVITY_SPEED_RANGES_KMH, BIKE_SPEED_MIN_KMH, BIKE_SPEED_MAX_KMH
+
+GRANULARITIES = ("day", "week", "month", "year", "hour")
+
+# Что считается по каждой корзине
+SUM_FIELDS = ("count", "dist_m_total", "dist_m_speed", "dur_s_speed", "max_speed")
+
+# date.toordinal() для 1970-01-01: от него считаются номера дней в БД
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+# Сегменты колонками (numpy-массивы одной длины) для aggregate
+SegmentColumns = namedtuple(
+    "SegmentColumns", ("day", "start_ts", "distance_m", "duration_s", "speed_kmh")
+)
+
+
+def segment_columns(rows):
+    """
+    [(day, start_ts, distance_m, duration_s, speed_kmh), ...] -> SegmentColumns.
+    """
+    arr = np.array(rows, dtype=float).reshape(-1, 5)
+    return SegmentColumns(arr[:, 0].astype(np.int64), arr[:, 1].astype(np.int64),
+                          arr[:, 2], arr[:, 3], arr[:, 4])
+
+
+def speed_range(activity):
+    """
+    (min, max) скоростей, которые учитываются в средней и максимальной
+    скорости для типа activity.
+    """
+    return ACTIVITY_SPEED_RANGES_KMH.get(activity, (0.0, float("inf")))
+
+
+def group_sums(idx, n, distance_m, duration_s, speed_kmh,
+               speeds=(BIKE_SPEED_MIN_KMH, BIKE_SPEED_MAX_KMH)):
+    """
+    Суммы по группам idx (0..n-1) для строк-колонок:
+    количество, вся дистанция и, только по скоростям в диапазоне
+    speeds (по умолчанию — велосипеда; границы могут быть и массивами
+    по строкам), дистанция, длительность и максимум скорости.
+    """
+    valid = (speed_kmh >= speeds[0]) & (speed_kmh <= speeds[1])
+    valid_idx = idx[valid]
+    max_speed = np.zeros(n)
+    np.maximum.at(max_speed, valid_idx, speed_kmh[valid])
+    return {
+        "count": np.bincount(idx, minlength=n),
+        "dist_m_total": np.bincount(idx, weights=distance_m, minlength=n),
+        "dist_m_speed": np.bincount(valid_idx, weights=distance_m[valid], minlength=n),
+        "dur_s_speed": np.bincount(valid_idx, weights=duration_s[valid], minlength=n),
+        "max_speed": max_speed,
+    }
+
+
+def regroup(sums, idx, n):
+    """
+    Сворачивает уже посчитанные суммы (например, по дням) в более
+    крупные группы idx.
+    """
+    max_speed = np.zeros(n)
+    np.maximum.at(max_speed, idx, sums["max_speed"])
+    result = {
+        name: np.bincount(idx, weights=sums[name], minlength=n)
+        for name in ("dist_m_total", "dist_m_speed", "dur_s_speed")
+    }
+    result["count"] = np.bincount(idx, weights=sums["count"], minlength=n).astype(np.int64)
+    result["max_speed"] = max_speed
+    return result
+
+
+# ---------- Ключи корзин по номеру дня ----------
+
+def _week_key(days):
+    # Номер дня понедельника ISO-недели (1970-01-01 — четверг)
+    return days - (days + 3) % 7
+
+
+def _month_key(days):
+    return days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+
+
+def _year_key(days):
+    return days.astype("datetime64[D]").astype("datetime64[Y]").astype(np.int64)
+
+
+def _week_label(monday):
+    iso = date.fromordinal(monday + EPOCH_ORDINAL + 3).isocalendar()
+    return (iso[0], iso[1])
+
+
+DAY_BUCKETS = {
+    "week": (_week_key, _week_label),
+    "month": (_month_key, lambda m: (1970 + m // 12, m % 12 + 1)),
+    "year": (_year_key, lambda y: 1970 + y),
+}
+
+
+class Buckets:
+    """
+    Результат по одной гранулярности: параллельные массивы, по элементу
+    на корзину, в порядке возрастания ключа.
+    """
+
+    __slots__ = ("granularity", "keys", "labels") + SUM_FIELDS
+
+    def __init__(self, granularity, keys, labels, sums):
+        self.granularity = granularity
+        self.keys = keys
+        self.labels = labels
+        for name in SUM_FIELDS:
+            setattr(self, name, sums[name])
+
+    def __len__(self):
+        return len(self.keys)
+
+    def nonempty(self):
+        """
+        Те же корзины без пустых (count == 0).
+        """
+        keep = self.count > 0
+        return Buckets(
+            self.granularity,
+            self.keys[keep],
+            [label for label, k in zip(self.labels, keep) if k],
+            {name: getattr(self, name)[keep] for name in SUM_FIELDS},
+        )
+
+    def as_dict(self):
+        """
+        label -> {dist_m_total, dist_m_speed, dur_s_speed, max_speed}
+        (формат прежних aggregate_by_*).
+        """
+        return {
+            label: {
+                "dist_m_total": float(self.dist_m_total[i]),
+                "dist_m_speed": float(self.dist_m_speed[i]),
+                "dur_s_speed": float(self.dur_s_speed[i]),
+                "max_speed": float(self.max_speed[i]),
+            }
+            for i, label in enumerate(self.labels)
+        }
+
+
+def fold_days(first_day, daily, granularity):
+    """
+    Плотные суммы по дням (daily: SUM_FIELDS -> массив, индекс —
+    day - first_day) -> Buckets по гранулярности day/week/month/year.
+    Пустые корзины остаются: ряд идёт без пропусков от первого дня до
+    последнего, крайние недели и месяцы неполные. Метки корзин:
+    day — date, week — (ISO-год, ISO-неделя), month — (год, месяц),
+    year — год.
+    """
+    days = np.arange(first_day, first_day + len(daily["count"]), dtype=np.int64)
+    if granularity == "day":
+        return Buckets(granularity, days, days.astype("datetime64[D]").tolist(), daily)
+    if granularity not in DAY_BUCKETS:
+        raise ValueError("unknown granularity: %s" % granularity)
+    key_fn, to_label = DAY_BUCKETS[granularity]
+    keys, idx = np.unique(key_fn(days), return_inverse=True)
+    return Buckets(
+        granularity,
+        keys,
+        [to_label(int(k)) for k in keys],
+        regroup(daily, idx, len(keys)),
+    )
+
+
+def aggregate(columns, granularities=("day",), utc_offset_s=0, days=None,
+              speeds=(BIKE_SPEED_MIN_KMH, BIKE_SPEED_MAX_KMH)):
+    """
+    {гранулярность: Buckets} для всех запрошенных гранулярностей за один
+    проход по сегментам (columns — SegmentColumns): календарные корзины
+    собираются из одних плотных сумм по дням, hour — суммы по часу
+    начала сегмента.
+
+    Корзины, как у fold_days, идут без пропусков: дни — days=(первый,
+    последний номер дня; сегменты должны лежать в них) или от первого
+    до последнего дня данных, часы — все 0..23. Пустые убирает
+    Buckets.nonempty. В БД нет часового пояса: час берётся из start_ts
+    со сдвигом utc_offset_s (0 — часы по UTC). speeds — как в group_sums.
+    """
+    unknown = set(granularities) - set(GRANULARITIES)
+    if unknown:
+        raise ValueError("unknown granularity: %s" % ", ".join(sorted(unknown)))
+
+    result = {}
+    calendar = [g for g in granularities if g != "hour"]
+    if calendar:
+        if days is None:
+            days = (int(columns.day.min()), int(columns.day.max())) \
+                if len(columns.day) else (0, -1)
+        first, last = days
+        daily = group_sums(
+            columns.day - first, last - first + 1,
+            columns.distance_m, columns.duration_s, columns.speed_kmh, speeds,
+        )
+        for g in calendar:
+            result[g] = fold_days(first, daily, g)
+
+    if "hour" in granularities:
+        hours = (columns.start_ts + utc_offset_s) // 3600 % 24
+        sums = group_sums(
+            hours, 24, columns.distance_m, columns.duration_s, columns.speed_kmh, speeds
+        )
+        result["hour"] = Buckets("hour", np.arange(24), list(range(24)), sums)
+
+    return result
@@ -1,60 +1,648 @@
-from flask import Flask, request, jsonify
-import sqlite3
+from flask import Flask, request, jsonify, g, has_app_context, send_file
 from flask_cors import CORS
-from datetime import datetime, date, timedelta
-import math
+from dotenv import load_dotenv
+from datetime import datetime, date, timedelta, timezone
+import atexit
+import hashlib
+import hmac
+import io
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 from constants import (
-    BIKE_RADIUS_M,
     SCOOTER_RADIUS_M,
-    BUS_RADIUS_M,
     BIKE_SPEED_MIN_KMH,
     BIKE_SPEED_MAX_KMH,
-    BIKE_PRIORITY_LOCATIONS,
     SCOOTER_A,
     SCOOTER_B,
     SCOOTER_PARKING,
     BUS_STOPS,
 )
+from aggregate import EPOCH_ORDINAL, aggregate, fold_days, segment_columns, speed_range
+from classify_batch import classify_activity_batch
+from dedup import (
+    HashingReader,
+    file_sha256,
+    find_imported_file,
+    load_watermark,
+    record_events,
+    record_imported_file,
+    split_seen,
+)
+from geo import (
+    is_near,
+    geo_counters_snapshot,
+    GEO_COUNTERS,
+    BIKE_LOCATIONS_INDEX,
+    BUS_STOPS_INDEX,
+)
+from history_stream import (
+    detect_compression,
+    iter_events_from_file,
+    iter_history_events,
+)
+from metrics import METRICS, Metrics, Timings, stage
+from profiling import ProfileStore
+from shards import ShardRouter
+from stats_cache import make_stats_cache
+from telegram_auth import init_data_user_id
+
+# Тот же .env, что у ботов (bot_common.py): API_TOKEN и настройки ниже
+load_dotenv()
 
 DB_PATH = "travel.db"
 
+# Файлы БД пользователей бота (см. shards.py); по умолчанию — users/
+# рядом с DB_PATH
+USER_DB_DIR = os.getenv("USER_DB_DIR")
+
+# Сколько файлов пользователей держать открытыми (пулы и хранилища в памяти)
+USER_SHARDS_OPEN = int(os.getenv("USER_SHARDS_OPEN", "256"))
+
+# Сколько сегментов пишем в SQLite одним executemany / одной транзакцией
+IMPORT_BATCH_SIZE = 5000
+
+# Процессы для разбора и классификации при импорте (1 — без пула)
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "1"))
+
+# Куда /import складывает загруженные файлы до фоновой обработки
+IMPORT_SPOOL_DIR = os.getenv("IMPORT_SPOOL_DIR", "import_spool")
+SPOOL_CHUNK_SIZE = 1024 * 1024
+
+# PRAGMA user_version: 0 — старая схема с датами-строками, 1 — компактная,
+# 2 — компактная с поколением строки (segments.gen)
+SCHEMA_VERSION = 2
+
+# Самый длинный период, который отдаёт /stats/range (дней)
+STATS_RANGE_MAX_DAYS = 100 * 366
+
+# Окно правдоподобных дат событий: начало не раньше 2000 года, конец
+# не позже чем через сутки от «сейчас». Остальное — битые выгрузки; они
+# растянули бы плотные массивы ColumnStore [тип, день] на тысячелетия
+EARLIEST_EVENT_DATE = date(2000, 1, 1)
+EVENT_MAX_AHEAD_S = 24 * 3600
+
+# /stats?activity=all — статистика сразу по всем типам
+ALL_ACTIVITIES = "all"
+
+# Токен бота Telegram (тот же API_TOKEN, что у ботов): им проверяется
+# подпись initData Web App, и с ним же боты передают ?user_id=.
+# Без него запросы к файлам пользователей отклоняются
+BOT_TOKEN = os.getenv("API_TOKEN")
+# Сколько действительна initData Web App (секунд от auth_date)
+INIT_DATA_MAX_AGE_S = 24 * 3600
+
+# Профилирование отдельных запросов (см. profiling.py): токен
+# администратора; без него выключено
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_SORT_KEYS = ("cumulative", "tottime", "ncalls", "name", "filename")
+
 
 app = Flask(__name__)
 CORS(app, resources={r"*": {"origins": "http://localhost:5173"}})
 
+# Готовые ответы /stats по ключу (base_date, data_generation, activity, user_id)
+stats_cache = make_stats_cache()
+
+# Профили запросов с X-Profile: <PROFILE_TOKEN>, последние PROFILE_KEEP
+profiles = ProfileStore(PROFILE_DIR, PROFILE_KEEP)
+
+# Фоновые импорты идут по одному, чтобы не толкаться за запись в SQLite
+import_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="import")
+
+# Проверки расстояний (geo) — тоже в /metrics
+METRICS.extra = lambda: {
+    "haversine_calls_total": (
+        "Проверок расстояний, дошедших до haversine", GEO_COUNTERS["haversine"]
+    ),
+    "haversine_avoided_total": (
+        "Проверок расстояний, отсеянных без haversine", GEO_COUNTERS["avoided"]
+    ),
+}
+
+
+
+def make_shards(path, users_dir=None):
+    return ShardRouter(
+        path,
+        users_dir or USER_DB_DIR or os.path.join(os.path.dirname(path), "users"),
+        init=lambda shard: init_shard(shard),
+        max_open=USER_SHARDS_OPEN,
+    )
+
+
+# Основной файл и файлы пользователей: у каждого свой пул соединений
+# и своё колоночное хранилище для /stats (см. load_column_store)
+shards = make_shards(DB_PATH)
+
+
+def configure_db(path, users_dir=None):
+    """
+    Переключает приложение на другой файл БД (бенчмарки, миграции).
+    """
+    global DB_PATH, shards
+    shards.close_all()
+    DB_PATH = path
+    shards = make_shards(path, users_dir)
+
+
+def current_shard():
+    """
+    Файл БД текущего запроса (?user_id=, см. select_shard); вне
+    запроса и без user_id — основной.
+    """
+    if has_app_context():
+        shard = g.get("shard")
+        if shard is not None:
+            return shard
+    return shards.default
+
+
 def get_db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """
+    Соединение из пула текущего файла БД (current_shard).
+    Внутри запроса Flask — одно на запрос, в пул вернётся в teardown.
+    Вне запроса его нужно вернуть самому через release_db.
+    """
+    if has_app_context():
+        conn = g.get("db")
+        if conn is None:
+            g.db_shard = current_shard()
+            conn = g.db = g.db_shard.pool.acquire()
+        return conn
+    return shards.default.pool.acquire()
 
 
-def init_db():
-    conn = get_db()
+def release_db(conn, shard=None):
+    (shard or shards.default).pool.release(conn)
+
+
+def profile_token_ok():
+    """
+    Токен администратора в заголовке X-Profile или в ?profile=.
+    """
+    token = request.headers.get("X-Profile") or request.args.get("profile")
+    if not PROFILE_TOKEN or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+
+
+@app.before_request
+def start_profile():
+    """
+    Запрос с токеном администратора выполняется под cProfile, профиль
+    уходит в profiles (см. save_profile и /profiles). Без PROFILE_TOKEN
+    на запрос приходится одна проверка.
+    """
+    if PROFILE_TOKEN is None or request.endpoint in ("list_profiles", "get_profile"):
+        return None
+    if profile_token_ok():
+        g.profile_started = time.perf_counter()
+        # None — в процессе уже профилируется другой запрос
+        g.profiler = profiles.start()
+        if g.profiler is None:
+            g.pop("profiler")
+            g.profile_busy = True
+    return None
+
+
+@app.after_request
+def save_profile(response):
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiles.stop(profiler)
+        # Токен в профиль не пишем
+        query = [(k, v) for k, v in request.args.items(multi=True) if k != "profile"]
+        response.headers["X-Profile-Id"] = profiles.save(profiler, {
+            "method": request.method,
+            "path": request.path,
+            "query": query,
+            "status": response.status_code,
+            "duration_ms": round((time.perf_counter() - g.profile_started) * 1000, 3),
+        })
+    elif g.get("profile_busy"):
+        response.headers["X-Profile-Id"] = "busy"
+    return response
+
+
+@app.teardown_request
+def stop_profile(exc):
+    # Запрос оборвался до save_profile — профилировщик всё равно выключаем
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        profiles.stop(profiler)
+
+
+def bot_token_ok():
+    """
+    Запрос от бота: токен бота в заголовке X-Bot-Token.
+    """
+    token = request.headers.get("X-Bot-Token")
+    if not BOT_TOKEN or token is None:
+        return False
+    return hmac.compare_digest(token.encode(), BOT_TOKEN.encode())
+
+
+@app.before_request
+def select_shard():
+    """
+    Запрос пользователя Telegram идёт в его файл БД. Пользователь — из
+    заголовка X-Telegram-Init-Data (initData Web App, подпись проверяется
+    токеном бота) или из ?user_id=, который принимается только от ботов
+    (X-Bot-Token). Без них — основной файл. Файл создаёт первый /import,
+    для остальных запросов незнакомый пользователь — 404.
+    """
+    init_data = request.headers.get("X-Telegram-Init-Data")
+    user_id = request.args.get("user_id")
+    if init_data is not None:
+        user_id = init_data_user_id(init_data, BOT_TOKEN, INIT_DATA_MAX_AGE_S)
+        if user_id is None:
+            return jsonify({"error": "invalid Telegram init data"}), 401
+    elif user_id is not None:
+        if not bot_token_ok():
+            return jsonify({"error": "user_id is accepted only from the bot"}), 403
+        try:
+            user_id = int(user_id)
+        except ValueError:
+            user_id = 0
+        if user_id <= 0:
+            return jsonify({"error": "user_id must be a positive integer"}), 400
+    else:
+        return None
+
+    shard = shards.get(
+        user_id, create=request.endpoint == "import_location_history"
+    )
+    if shard is None:
+        return jsonify({"error": "Unknown user"}), 404
+    g.shard = shard
+    return None
+
+
+@app.teardown_appcontext
+def teardown_db(exc):
+    conn = g.pop("db", None)
+    if conn is not None:
+        release_db(conn, g.pop("db_shard", None))
+
+
+def request_timings(path):
+    """
+    Timings текущего запроса: стадии идут в /metrics и, если клиент
+    попросил, в заголовок Server-Timing (см. add_server_timing).
+    """
+    if "timings" not in g:
+        g.timings = Timings(path)
+    return g.timings
+
+
+@app.after_request
+def add_server_timing(response):
+    """
+    ?timing=1 или заголовок X-Timing: 1 — время стадий запроса
+    в Server-Timing.
+    """
+    timings = g.get("timings")
+    if timings is not None and (
+        request.args.get("timing") in ("1", "true")
+        or request.headers.get("X-Timing") in ("1", "true")
+    ):
+        response.headers["Server-Timing"] = timings.server_timing()
+        response.headers["Timing-Allow-Origin"] = "*"
+    return response
+
+
+atexit.register(lambda: shards.close_all())
+
+
+def create_segments_table(conn):
+    """
+    Компактная схема segments: время — секунды epoch, дата — номер дня
+    от 1970-01-01 (day_number), тип — id из activity_types, gen —
+    поколение данных, в котором строка добавлена (0 — до появления
+    колонки). Первичный ключ заменяет прежний UNIQUE, отдельного rowid нет.
+    """
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS activity_types (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS segments (
+            start_ts INTEGER NOT NULL,
+            end_ts INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            activity_id INTEGER NOT NULL REFERENCES activity_types (id),
+            distance_m REAL NOT NULL,
+            duration_s REAL NOT NULL,
+            speed_kmh REAL NOT NULL,
+            gen INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (start_ts, end_ts, activity_id, distance_m)
+        ) WITHOUT ROWID
+        """
+    )
+    # Компактные БД до появления gen
+    columns = {r[1] for r in conn.execute("PRAGMA table_info(segments)")}
+    if "gen" not in columns:
+        conn.execute("ALTER TABLE segments ADD COLUMN gen INTEGER NOT NULL DEFAULT 0")
+    # По нему хранилище в памяти дочитывает только новые строки
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_segments_gen ON segments (gen)")
+    # Покрывающий для /stats/range с часами (range_columns): сегменты
+    # типа за период читаются без обращения к таблице
+    conn.execute(
+        """
+        CREATE INDEX IF NOT EXISTS idx_segments_activity_day_ts ON segments
+        (activity_id, day, start_ts, distance_m, duration_s, speed_kmh)
+        """
+    )
+
+
+def has_legacy_segments(conn):
+    columns = {r[1] for r in conn.execute("PRAGMA table_info(segments)")}
+    return "start_time" in columns
+
+
+def migrate_legacy_segments(conn):
+    """
+    segments со старой схемой (ISO-строки и тип текстом) -> компактная.
+    Одна транзакция: при ошибке БД остаётся как была.
+    Возвращает (строк было, строк стало).
+    """
+    conn.execute("BEGIN")
+    try:
+        before = conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+        conn.execute("ALTER TABLE segments RENAME TO segments_legacy")
+        conn.execute("DROP INDEX IF EXISTS idx_segments_activity_date")
+        create_segments_table(conn)
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO activity_types (name)
+            SELECT DISTINCT activity_type FROM segments_legacy
+            """
+        )
+        # strftime('%s') понимает и доли секунды, и смещение +01:00;
+        # 2440587.5 — юлианский день 1970-01-01
+        conn.execute(
+            """
+            INSERT OR IGNORE INTO segments
+            (start_ts, end_ts, day, activity_id,
+             distance_m, duration_s, speed_kmh)
+            SELECT
+                CAST(strftime('%s', s.start_time) AS INTEGER),
+                CAST(strftime('%s', s.end_time) AS INTEGER),
+                CAST(julianday(s.start_date) - 2440587.5 AS INTEGER),
+                t.id,
+                s.distance_m,
+                s.duration_s,
+                s.speed_kmh
+            FROM segments_legacy s
+            JOIN activity_types t ON t.name = s.activity_type
+            """
+        )
+        after = conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+        conn.execute("DROP TABLE segments_legacy")
+        conn.execute("PRAGMA user_version = %d" % SCHEMA_VERSION)
+    except Exception:
+        conn.rollback()
+        raise
+    conn.commit()
+    return before, after
+
+
+def init_db(fail_interrupted=True):
+    """
+    Основной файл БД: схема данных и очередь фоновых импортов.
+
+    fail_interrupted=False — незавершёнными задачами импорта других
+    процессов не трогать, если эти процессы живы: так вызывают рабочие
+    процессы uvicorn (asgi.py), пока соседние, возможно, ещё выполняют
+    свои задачи. Задачи умерших процессов (uvicorn перезапустил
+    упавший) помечаются failed в любом случае.
+    """
+    init_shard(shards.default)
+    conn = shards.default.pool.acquire()
+    try:
+        # Фоновые импорты и их прогресс (общие для всех процессов
+        # и пользователей)
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS import_jobs (
+                id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                processed INTEGER NOT NULL DEFAULT 0,
+                imported INTEGER NOT NULL DEFAULT 0,
+                skipped INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                result TEXT
+            )
+            """
+        )
+        # Чья задача и какой файл спула: по ним находятся задачи умерших
+        # процессов (в старой таблице этих колонок нет)
+        columns = {r[1] for r in conn.execute("PRAGMA table_info(import_jobs)")}
+        for name, decl in (("worker_pid", "INTEGER"), ("spool_path", "TEXT")):
+            if name not in columns:
+                conn.execute("ALTER TABLE import_jobs ADD COLUMN %s %s" % (name, decl))
+        # Задачи, которые не доделались до перезапуска, уже не продолжатся
+        if fail_interrupted:
+            conn.execute(
+                """
+                UPDATE import_jobs
+                SET state = 'failed', error = 'interrupted by restart'
+                WHERE state IN ('queued', 'running')
+                """
+            )
+            clear_spool()
+        else:
+            fail_orphaned_jobs(conn)
+        conn.commit()
+    finally:
+        release_db(conn)
+
+
+def fail_orphaned_jobs(conn):
+    """
+    Незавершённые задачи процессов, которых уже нет: помечает failed
+    и удаляет их файлы спула. Свой pid тоже считается умершим — при
+    старте у процесса задач ещё нет, а pid мог достаться от упавшего.
+    """
+    rows = conn.execute(
+        """
+        SELECT id, worker_pid, spool_path FROM import_jobs
+        WHERE state IN ('queued', 'running') AND worker_pid IS NOT NULL
+        """
+    ).fetchall()
+    for job_id, pid, spool_path in rows:
+        if pid != os.getpid() and process_alive(pid):
+            continue
+        conn.execute(
+            """
+            UPDATE import_jobs
+            SET state = 'failed', error = 'worker process exited', finished_at = ?
+            WHERE id = ? AND state IN ('queued', 'running')
+            """,
+            (time.time(), job_id),
+        )
+        if spool_path:
+            try:
+                os.remove(spool_path)
+            except OSError:
+                pass
+
+
+def process_alive(pid):
+    if os.name == "nt":
+        # os.kill на Windows завершает процесс, а не проверяет его
+        return True
     try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def clear_spool():
+    """
+    Удаляет файлы спула: после перезапуска их задачи уже помечены
+    failed, а сами загрузки никто не дочитает.
+    """
+    try:
+        names = os.listdir(IMPORT_SPOOL_DIR)
+    except OSError:
+        return
+    for name in names:
+        if name.endswith(".upload"):
+            try:
+                os.remove(os.path.join(IMPORT_SPOOL_DIR, name))
+            except OSError:
+                pass
+
+
+def init_shard(shard):
+    """
+    Схема данных в файле БД shard (основном или пользователя).
+    """
+    conn = shard.pool.acquire()
+    try:
+        # Старую БД переводим на компактную схему сразу (см. migrate_db.py)
+        if has_legacy_segments(conn):
+            migrate_legacy_segments(conn)
+        create_segments_table(conn)
+        # Суммы по дням теперь только в колоночном хранилище
+        # (load_column_store): прежние свёртка и индекс под неё не нужны
+        conn.execute("DROP TABLE IF EXISTS daily_cycling_stats")
+        conn.execute("DROP INDEX IF EXISTS idx_segments_activity_day")
+        # Служебные значения, например data_generation
         conn.execute(
             """
-            CREATE TABLE IF NOT EXISTS segments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                start_time TEXT NOT NULL,
-                end_time TEXT NOT NULL,
-                start_date TEXT NOT NULL,
-                activity_type TEXT NOT NULL,
-                distance_m REAL NOT NULL,
-                duration_s REAL NOT NULL,
-                speed_kmh REAL NOT NULL,
-                UNIQUE(start_time, end_time, activity_type, distance_m)
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
             )
             """
         )
+        # Начинаем не с нуля, а со времени создания: у пересозданной БД
+        # поколения не совпадут со старыми ключами кэша
+        conn.execute(
+            "INSERT OR IGNORE INTO meta (key, value) VALUES ('data_generation', ?)",
+            (int(time.time()),),
+        )
+        conn.execute(
+            "INSERT OR IGNORE INTO meta (key, value) VALUES ('events_watermark', 0)"
+        )
+        # Хэши уже импортированных событий и файлов (см. dedup.py)
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS event_hashes (
+                hash INTEGER PRIMARY KEY
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS imported_files (
+                sha256 TEXT PRIMARY KEY,
+                imported_at REAL NOT NULL,
+                events INTEGER NOT NULL,
+                rows INTEGER NOT NULL
+            ) WITHOUT ROWID
+            """
+        )
+        conn.execute("PRAGMA user_version = %d" % SCHEMA_VERSION)
         conn.commit()
     finally:
-        conn.close()
+        shard.pool.release(conn)
+
+
+def get_data_generation(conn):
+    """
+    Номер поколения данных: растёт, когда импорт добавил сегменты.
+    """
+    row = conn.execute(
+        "SELECT value FROM meta WHERE key = 'data_generation'"
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def bump_data_generation(conn):
+    """
+    Следующее поколение данных; вызывать в транзакции записи, которая
+    помечает им новые строки segments. Возвращает (старое, новое).
+    """
+    old = get_data_generation(conn)
+    conn.execute(
+        "UPDATE meta SET value = value + 1 WHERE key = 'data_generation'"
+    )
+    return old, old + 1
 
 
 def parse_iso(ts_str):
-    # Разбирает ISO-строку, например "2024-11-20T11:24:00.449+01:00"
-    return datetime.fromisoformat(ts_str)
+    # Разбирает ISO-строку, например "2024-11-20T11:24:00.449+01:00".
+    # Время без смещения считаем UTC — как strftime('%s') в SQLite
+    # (migrate_legacy_segments), а не местным временем сервера
+    dt = datetime.fromisoformat(ts_str)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def day_number(d):
+    """
+    date -> номер дня от 1970-01-01 (так дни хранятся в БД).
+    """
+    return d.toordinal() - EPOCH_ORDINAL
+
+
+def day_date(n):
+    return date.fromordinal(n + EPOCH_ORDINAL)
+
+
+EARLIEST_EVENT_DAY = day_number(EARLIEST_EVENT_DATE)
 
 
 def parse_geo(geo_str):
@@ -72,36 +660,6 @@ def parse_geo(geo_str):
         return None, None
 
 
-def haversine_m(lat1, lon1, lat2, lon2):
-    """
-    Расстояние между двумя точками (lat, lon) в метрах.
-    """
-    if None in (lat1, lon1, lat2, lon2):
-        return None
-    R = 6371000.0
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(
-        dlambda / 2
-    ) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
-
-
-def is_near(lat, lon, target_lat, target_lon, radius_m):
-    dist = haversine_m(lat, lon, target_lat, target_lon)
-    return dist is not None and dist <= radius_m
-
-
-def is_near_any(lat, lon, locations, radius_m):
-    for loc in locations:
-        if is_near(lat, lon, loc["lat"], loc["lon"], radius_m):
-            return True
-    return False
-
-
 def is_scooter_segment(start_lat, start_lon, end_lat, end_lon):
     """
     2 группа правил (электросамокат).
@@ -149,8 +707,8 @@ def is_bus_segment(start_lat, start_lon, end_lat, end_lon):
     if not BUS_STOPS:
         return False
 
-    start_near = is_near_any(start_lat, start_lon, BUS_STOPS, BUS_RADIUS_M)
-    end_near = is_near_any(end_lat, end_lon, BUS_STOPS, BUS_RADIUS_M)
+    start_near = BUS_STOPS_INDEX.near_any(start_lat, start_lon)
+    end_near = BUS_STOPS_INDEX.near_any(end_lat, end_lon)
     return start_near and end_near
 
 
@@ -172,16 +730,21 @@ def classify_activity(raw_type, speed_kmh, start_lat, start_lon, end_lat, end_lo
         return "in bus"
 
     if BIKE_SPEED_MIN_KMH <= speed_kmh <= BIKE_SPEED_MAX_KMH:
-        if is_near_any(start_lat, start_lon, BIKE_PRIORITY_LOCATIONS, BIKE_RADIUS_M) or \
-           is_near_any(end_lat, end_lon, BIKE_PRIORITY_LOCATIONS, BIKE_RADIUS_M):
+        if BIKE_LOCATIONS_INDEX.near_any(start_lat, start_lon) or \
+           BIKE_LOCATIONS_INDEX.near_any(end_lat, end_lon):
             return "cycling"
 
     return raw_type or "unknown"
 
 
-def event_to_row(ev):
+def parse_event(ev):
     """
-    Один объект из location-history.json -> строка для БД.
+    Один объект из location-history.json -> поля сегмента без классификации:
+    (start_ts, end_ts, day, raw_type, dist_m, duration_s,
+     speed_kmh, start_lat, start_lon, end_lat, end_lon)
+    start_ts/end_ts — секунды epoch, day — day_number даты начала
+    (в её собственном часовом поясе, как в выгрузке). События вне окна
+    EARLIEST_EVENT_DATE .. сейчас + EVENT_MAX_AHEAD_S отбрасываются.
     """
     if "activity" not in ev:
         return None
@@ -206,6 +769,11 @@ def event_to_row(ev):
     if duration_s <= 0:
         return None
 
+    day = start_dt.toordinal() - EPOCH_ORDINAL
+    end_ts = int(end_dt.timestamp())
+    if day < EARLIEST_EVENT_DAY or end_ts > time.time() + EVENT_MAX_AHEAD_S:
+        return None
+
     speed_kmh = (dist_m / 1000.0) / (duration_s / 3600.0)
 
     start_geo = ev["activity"].get("start")
@@ -215,6 +783,32 @@ def event_to_row(ev):
 
     raw_type = act.get("topCandidate", {}).get("type")
 
+    return (
+        int(start_dt.timestamp()),
+        end_ts,
+        day,
+        raw_type,
+        dist_m,
+        duration_s,
+        speed_kmh,
+        start_lat,
+        start_lon,
+        end_lat,
+        end_lon,
+    )
+
+
+def event_to_row(ev):
+    """
+    Один объект из location-history.json -> строка для БД.
+    """
+    parsed = parse_event(ev)
+    if parsed is None:
+        return None
+
+    (start_ts, end_ts, day, raw_type, dist_m, duration_s,
+     speed_kmh, start_lat, start_lon, end_lat, end_lon) = parsed
+
     activity_type = classify_activity(
         raw_type=raw_type,
         speed_kmh=speed_kmh,
@@ -224,12 +818,10 @@ def event_to_row(ev):
         end_lon=end_lon,
     )
 
-    start_date = start_dt.date().isoformat()
-
     return (
-        ev["startTime"],
-        ev["endTime"],
-        start_date,
+        start_ts,
+        end_ts,
+        day,
         activity_type,
         dist_m,
         duration_s,
@@ -237,111 +829,528 @@ def event_to_row(ev):
     )
 
 
-# ---------- Агрегации с учётом валидных скоростей ----------
+def events_to_rows(events, timings=None):
+    """
+    Пачка событий -> строки для БД.
+    То же, что event_to_row для каждого события, но классификация
+    идёт одним векторным проходом (classify_batch).
+    timings — куда записать время стадий parse (parse_event, включая
+    parse_iso) и classify.
+    """
+    with stage(timings, "parse"):
+        parsed = [p for p in map(parse_event, events) if p is not None]
+    if not parsed:
+        return []
+
+    (start_ts, end_ts, days, raw_types, dists, durations,
+     speeds, start_lats, start_lons, end_lats, end_lons) = zip(*parsed)
+
+    with stage(timings, "classify"):
+        activity_types = classify_activity_batch(
+            raw_types,
+            speeds,
+            np.array(start_lats, dtype=float),
+            np.array(start_lons, dtype=float),
+            np.array(end_lats, dtype=float),
+            np.array(end_lons, dtype=float),
+        )
+
+    return list(zip(
+        start_ts,
+        end_ts,
+        days,
+        activity_types,
+        dists,
+        durations,
+        speeds,
+    ))
+
+
+# ---------- Импорт ----------
+
+def peak_rss_kb():
+    """
+    Пиковое потребление памяти процессом (КБ), если платформа это умеет.
+    """
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+INSERT_SEGMENT_SQL = """
+    INSERT OR IGNORE INTO segments
+    (start_ts, end_ts, day, activity_id,
+     distance_m, duration_s, speed_kmh, gen)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Строки segments для ColumnStore
+STORE_ROWS_SQL = """
+    SELECT activity_id, day, distance_m, duration_s, speed_kmh
+    FROM segments
+"""
+
+
+def activity_type_ids(conn, names):
+    """
+    Названия типов -> их id в activity_types (новые добавляются).
+    """
+    names = list(names)
+    conn.executemany(
+        "INSERT OR IGNORE INTO activity_types (name) VALUES (?)",
+        ((name,) for name in names),
+    )
+    cur = conn.execute(
+        "SELECT name, id FROM activity_types WHERE name IN (%s)"
+        % ",".join("?" * len(names)),
+        names,
+    )
+    return dict(cur.fetchall())
+
+
+def write_segments(conn, rows, event_hashes=(), max_start_ts=None, shard=None):
+    """
+    Пишет пачку строк одной транзакцией. В той же транзакции
+    запоминает хэши событий, из которых строки получены
+    (dedup.record_events), и, если что-то вставлено, переводит данные
+    в следующее поколение — им помечены новые строки (segments.gen).
+    Возвращает, сколько реально вставлено (дубликаты INSERT OR IGNORE
+    в total_changes не попадают).
+
+    Новые строки дописываются и в колоночное хранилище shard (conn — его
+    соединение), если оно было на прошлом поколении; иначе его догонит
+    load_column_store. Под блокировкой хранилища — только COMMIT и
+    дописывание: загрузка из БД (тоже под ней) видит строки либо уже и
+    в хранилище, либо ещё нигде, а /stats не ждёт, пока пишется вся пачка.
+    """
+    store = (shard or current_shard()).store
+    inserted, ids, new_rows, generations = _write_segments(
+        conn, rows, event_hashes, max_start_ts
+    )
+    with store.lock:
+        try:
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        if inserted:
+            old, new = generations
+            if store.generation == old:
+                store.append(new_rows, ids)
+                store.advance(old, new)
+    return inserted
+
+
+def _write_segments(conn, rows, event_hashes, max_start_ts):
+    # Сразу блокировка записи: поколение читается и увеличивается
+    # в одной транзакции, без гонки с другими процессами
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        ids = activity_type_ids(conn, {row[3] for row in rows}) if rows else {}
+        old = get_data_generation(conn)
+        before = conn.total_changes
+        conn.executemany(
+            INSERT_SEGMENT_SQL,
+            [(r[0], r[1], r[2], ids[r[3]], r[4], r[5], r[6], old + 1) for r in rows],
+        )
+        inserted = conn.total_changes - before
+        new_rows, generations = [], None
+        if inserted:
+            generations = bump_data_generation(conn)
+            if inserted == len(rows):
+                new_rows = [(ids[r[3]], r[2], r[4], r[5], r[6]) for r in rows]
+            else:
+                # Часть строк — дубликаты: вставленные находим по поколению
+                new_rows = conn.execute(
+                    STORE_ROWS_SQL + " WHERE gen = ?", (old + 1,)
+                ).fetchall()
+        record_events(conn, event_hashes, max_start_ts)
+    except Exception:
+        conn.rollback()
+        raise
+    # COMMIT — в write_segments
+    return inserted, ids, new_rows, generations
+
 
-def aggregate_by_date(rows):
+def _rows_for_chunk(events):
+    """
+    Выполняется в рабочем процессе: пачка событий -> строки для БД,
+    сколько проверок расстояний там сделано и время стадий (счётчики
+    geo и METRICS в каждом процессе свои).
+    """
+    before = geo_counters_snapshot()
+    timings = Timings("import", Metrics())
+    rows = events_to_rows(events, timings)
+    after = geo_counters_snapshot()
+    return rows, {k: after[k] - before[k] for k in after}, timings.as_dict()
+
+
+def _collect_rows(future, timings):
+    rows, geo_delta, stages = future.result()
+    for k, v in geo_delta.items():
+        GEO_COUNTERS[k] += v
+    if timings is not None:
+        timings.merge(stages)
+    return rows
+
+
+def iter_chunks(events, size):
+    chunk = []
+    for ev in events:
+        chunk.append(ev)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_row_batches(chunks, workers=1, timings=None):
+    """
+    Пачки событий -> пачки строк в исходном порядке.
+    При workers > 1 разбор и классификация идут в пуле процессов;
+    в работе держим не больше 2 * workers пачек, чтобы не читать
+    весь поток наперёд.
+    """
+    if workers <= 1:
+        for chunk in chunks:
+            yield events_to_rows(chunk, timings)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_rows_for_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield _collect_rows(pending.popleft(), timings)
+        while pending:
+            yield _collect_rows(pending.popleft(), timings)
+
+
+def import_events(conn, events, batch_size=IMPORT_BATCH_SIZE, workers=None,
+                  on_progress=None, shard=None, timings=None):
+    """
+    Складывает события (любой iterable, в т.ч. генератор) в segments.
+    События разбираются, классифицируются и пишутся пачками по batch_size.
+
+    workers > 1 — параллельный режим: пачки уходят в пул процессов,
+    а в SQLite пишет один отдельный поток. Порядок записи тот же,
+    что и в последовательном режиме, поэтому результат совпадает.
+    on_progress(processed, imported, skipped) вызывается после каждой пачки.
+
+    Уже импортированные раньше события отсеиваются по хэшу ещё до
+    разбора (dedup.split_seen) и тоже считаются в skipped_duplicates.
+    shard — файл БД, которому принадлежит conn (по умолчанию
+    current_shard()). Возвращает счётчики для ответа /import.
+
+    Время стадий (read — чтение и разбор JSON, dedup, parse, classify,
+    sqlite_write, total) пишется в timings (по умолчанию — свой Timings
+    "import") и попадает в /metrics и в timings_s ответа. При workers > 1
+    parse и classify — сумма по процессам, она может быть больше total.
     """
-    date -> {
-      dist_m_total  — вся дистанция,
-      dist_m_speed  — дистанция только по валидным скоростям,
-      dur_s_speed   — длительность только по валидным,
-      max_speed     — макс скорость по валидным
+    if workers is None:
+        workers = IMPORT_WORKERS
+    shard = shard or current_shard()
+    if timings is None:
+        timings = Timings("import")
+
+    totals = {"imported": 0, "skipped": 0, "seen": 0, "processed": 0}
+    started = time.perf_counter()
+    geo_before = geo_counters_snapshot()
+    watermark = load_watermark(conn)
+    # Хэши для каждой отданной в разбор пачки, в том же порядке
+    pending_hashes = deque()
+
+    def counted_chunks(lookup_conn):
+        chunks = iter_chunks(events, batch_size)
+        while True:
+            # Для файла и потока запроса внутри next() — чтение и json
+            with timings.stage("read"):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return
+            totals["processed"] += len(chunk)
+            with timings.stage("dedup"):
+                fresh, hashes, max_ts, seen = split_seen(lookup_conn, chunk, watermark)
+            totals["seen"] += seen
+            if not fresh:
+                continue
+            pending_hashes.append((hashes, max_ts))
+            yield fresh
+
+    def write(rows):
+        hashes, max_ts = pending_hashes.popleft()
+        if rows or hashes:
+            with timings.stage("sqlite_write"):
+                inserted = write_segments(conn, rows, hashes, max_ts, shard)
+            totals["imported"] += inserted
+            totals["skipped"] += len(rows) - inserted
+        if on_progress is not None:
+            on_progress(
+                totals["processed"], totals["imported"],
+                totals["skipped"] + totals["seen"],
+            )
+
+    # Каждая записанная пачка сразу видна в /stats (своё поколение данных),
+    # даже если дальше импорт упадёт
+    if workers <= 1:
+        for rows in iter_row_batches(counted_chunks(conn), timings=timings):
+            write(rows)
+    else:
+        # conn занят потоком записи, хэши ищем через своё соединение
+        lookup_conn = shard.pool.acquire()
+        try:
+            _import_with_writer_thread(
+                iter_row_batches(counted_chunks(lookup_conn), workers, timings),
+                write, workers,
+            )
+        finally:
+            shard.pool.release(lookup_conn)
+
+    processed = totals["processed"]
+    elapsed = time.perf_counter() - started
+    geo_after = geo_counters_snapshot()
+    timings.add("total", elapsed)
+    METRICS.inc("import_events_total", processed)
+    METRICS.inc("import_rows_inserted_total", totals["imported"])
+    METRICS.inc("import_duplicates_total", totals["skipped"] + totals["seen"])
+    return {
+        "imported": totals["imported"],
+        "skipped_duplicates": totals["skipped"] + totals["seen"],
+        "skipped_before_parse": totals["seen"],
+        "events": processed,
+        "elapsed_s": round(elapsed, 3),
+        "events_per_s": round(processed / elapsed, 1) if elapsed > 0 else None,
+        "peak_rss_kb": peak_rss_kb(),
+        # Проверки расстояний: сколько дошло до haversine и сколько отсеяно
+        "haversine_calls": geo_after["haversine"] - geo_before["haversine"],
+        "haversine_avoided": geo_after["avoided"] - geo_before["avoided"],
+        "timings_s": timings.as_dict(),
     }
+
+
+def _import_with_writer_thread(row_batches, write, workers):
+    """
+    Пачки строк из row_batches пишет отдельный поток, пока текущий
+    читает поток событий и раздаёт работу процессам.
     """
-    result = {}
-    for r in rows:
-        d = datetime.fromisoformat(r["start_date"]).date()
-        dist_m = float(r["distance_m"])
-        dur_s = float(r["duration_s"])
-        speed = float(r["speed_kmh"])
-
-        info = result.get(d)
-        if info is None:
-            info = {
-                "dist_m_total": 0.0,
-                "dist_m_speed": 0.0,
-                "dur_s_speed": 0.0,
-                "max_speed": 0.0,
-            }
-            result[d] = info
-
-        # Дистанция для километража — всегда
-        info["dist_m_total"] += dist_m
-
-        # Скорости — только если в диапазоне велосипеда
-        if BIKE_SPEED_MIN_KMH <= speed <= BIKE_SPEED_MAX_KMH:
-            info["dist_m_speed"] += dist_m
-            info["dur_s_speed"] += dur_s
-            if speed > info["max_speed"]:
-                info["max_speed"] = speed
+    batches = queue.Queue(maxsize=2 * workers)
+    errors = []
+
+    def writer():
+        while True:
+            rows = batches.get()
+            if rows is None:
+                return
+            if errors:
+                continue
+            try:
+                write(rows)
+            except Exception as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=writer, name="segments-writer")
+    thread.start()
+    try:
+        for rows in row_batches:
+            if errors:
+                break
+            batches.put(rows)
+    finally:
+        batches.put(None)
+        thread.join()
 
+    if errors:
+        raise errors[0]
+
+
+def import_once(conn, digest, events, **kwargs):
+    """
+    import_events, если файл с таким sha256 ещё не импортировался
+    целиком; иначе сразу итог прошлого импорта.
+    """
+    result = find_imported_file(conn, digest)
+    if result is not None:
+        return result
+    result = import_events(conn, events, **kwargs)
+    record_imported_file(conn, digest, result)
     return result
 
 
-def aggregate_by_month(rows):
+def import_history_file(path, user_id=None):
     """
-    (year, month) -> агрегаты как выше.
+    Потоковый импорт location-history.json прямо с диска
+    (в файл БД пользователя user_id или в основной).
     """
-    result = {}
-    for r in rows:
-        d = datetime.fromisoformat(r["start_date"]).date()
-        key = (d.year, d.month)
-        dist_m = float(r["distance_m"])
-        dur_s = float(r["duration_s"])
-        speed = float(r["speed_kmh"])
+    shard = shards.get(user_id, create=True)
+    conn = shard.pool.acquire()
+    try:
+        return import_once(
+            conn, file_sha256(path), iter_events_from_file(path), shard=shard
+        )
+    finally:
+        shard.pool.release(conn)
 
-        info = result.get(key)
-        if info is None:
-            info = {
-                "dist_m_total": 0.0,
-                "dist_m_speed": 0.0,
-                "dur_s_speed": 0.0,
-                "max_speed": 0.0,
-            }
-            result[key] = info
 
-        info["dist_m_total"] += dist_m
+# ---------- Колоночное хранилище ----------
 
-        if BIKE_SPEED_MIN_KMH <= speed <= BIKE_SPEED_MAX_KMH:
-            info["dist_m_speed"] += dist_m
-            info["dur_s_speed"] += dur_s
-            if speed > info["max_speed"]:
-                info["max_speed"] = speed
+def load_column_store(conn, generation, shard=None):
+    """
+    Колоночное хранилище shard (conn — его соединение) для поколения
+    данных generation. Ещё не загруженное читается из segments целиком,
+    отставшее (импорт в другом процессе) дочитывает только строки
+    поколений после своего (segments.gen). Сегменты с датами вне окна
+    parse_event (импортированные до него или перенесённые из старой
+    схемы) пропускаются. Вызывать под его lock.
+    """
+    store = (shard or current_shard()).store
+    if store.generation is not None and store.generation >= generation:
+        return store
 
-    return result
+    cur = conn.cursor()
+    cur.row_factory = None
+    activities = dict(cur.execute("SELECT name, id FROM activity_types"))
+    # Строки поколения g закоммичены вместе с ним: всё, что <= generation,
+    # уже в БД, а более новое дочитается при следующем поколении
+    window = (EARLIEST_EVENT_DAY, time.time() + EVENT_MAX_AHEAD_S)
+    if store.generation is None:
+        cur.execute(
+            STORE_ROWS_SQL + " WHERE gen <= ? AND day >= ? AND start_ts <= ?",
+            (generation,) + window,
+        )
+        store.load(generation, cur.fetchall(), activities)
+    else:
+        cur.execute(
+            STORE_ROWS_SQL
+            + " WHERE gen > ? AND gen <= ? AND day >= ? AND start_ts <= ?",
+            (store.generation, generation) + window,
+        )
+        store.append(cur.fetchall(), activities)
+        store.advance(store.generation, generation)
+    return store
+
+
+# ---------- Фоновые импорты ----------
+
+def create_import_job(conn, spool_path=None):
+    job_id = uuid.uuid4().hex
+    conn.execute(
+        """
+        INSERT INTO import_jobs (id, state, created_at, worker_pid, spool_path)
+        VALUES (?, 'queued', ?, ?, ?)
+        """,
+        (job_id, time.time(), os.getpid(), spool_path),
+    )
+    conn.commit()
+    return job_id
 
 
-def aggregate_by_year(rows):
+def update_import_job(conn, job_id, **fields):
+    columns = ", ".join("%s = ?" % name for name in fields)
+    conn.execute(
+        "UPDATE import_jobs SET %s WHERE id = ?" % columns,
+        list(fields.values()) + [job_id],
+    )
+    conn.commit()
+
+
+def get_import_job(conn, job_id):
     """
-    year -> агрегаты как выше.
+    Состояние задачи для /import/<job_id> (None — такой нет).
     """
-    result = {}
-    for r in rows:
-        d = datetime.fromisoformat(r["start_date"]).date()
-        year = d.year
-        dist_m = float(r["distance_m"])
-        dur_s = float(r["duration_s"])
-        speed = float(r["speed_kmh"])
+    row = conn.execute(
+        "SELECT * FROM import_jobs WHERE id = ?", (job_id,)
+    ).fetchone()
+    if row is None:
+        return None
 
-        info = result.get(year)
-        if info is None:
-            info = {
-                "dist_m_total": 0.0,
-                "dist_m_speed": 0.0,
-                "dur_s_speed": 0.0,
-                "max_speed": 0.0,
-            }
-            result[year] = info
+    job = {
+        "job_id": row["id"],
+        "state": row["state"],
+        "processed": row["processed"],
+        "imported": row["imported"],
+        "skipped_duplicates": row["skipped"],
+        "error": row["error"],
+        "events_per_s": None,
+    }
+    if row["started_at"] is not None:
+        elapsed = (row["finished_at"] or time.time()) - row["started_at"]
+        job["elapsed_s"] = round(elapsed, 3)
+        if elapsed > 0:
+            job["events_per_s"] = round(row["processed"] / elapsed, 1)
+    if row["result"]:
+        job["result"] = json.loads(row["result"])
+    return job
 
-        info["dist_m_total"] += dist_m
 
-        if BIKE_SPEED_MIN_KMH <= speed <= BIKE_SPEED_MAX_KMH:
-            info["dist_m_speed"] += dist_m
-            info["dur_s_speed"] += dur_s
-            if speed > info["max_speed"]:
-                info["max_speed"] = speed
+def spool_upload(stream):
+    """
+    Пишет тело запроса во временный файл кусками, не держа его в памяти.
+    Возвращает (путь, размер, sha256).
+    """
+    os.makedirs(IMPORT_SPOOL_DIR, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix=".upload", dir=IMPORT_SPOOL_DIR)
+    reader = HashingReader(stream)
+    size = 0
+    with os.fdopen(fd, "wb") as f:
+        while True:
+            chunk = reader.read(SPOOL_CHUNK_SIZE)
+            if not chunk:
+                break
+            f.write(chunk)
+            size += len(chunk)
+    return path, size, reader.hexdigest()
+
+
+def run_import_job(job_id, path, workers, digest, shard, queued_at):
+    """
+    Выполняется в import_executor: импорт файла из спула в файл БД
+    shard с отметками прогресса в import_jobs (они в основном файле).
+    Стадии — в /metrics с path="import_job": queue (ожидание в очереди
+    с queued_at по time.monotonic()) и стадии import_events.
+    """
+    timings = Timings("import_job")
+    timings.add("queue", time.monotonic() - queued_at)
+    conn = shards.default.pool.acquire()
+    data_conn = shard.pool.acquire()
+    try:
+        update_import_job(conn, job_id, state="running", started_at=time.time())
 
-    return result
+        def progress(processed, imported, skipped):
+            update_import_job(
+                conn, job_id,
+                processed=processed, imported=imported, skipped=skipped,
+            )
+
+        try:
+            result = import_once(
+                data_conn, digest, iter_events_from_file(path),
+                workers=workers, on_progress=progress, shard=shard,
+                timings=timings,
+            )
+        except Exception as e:
+            update_import_job(
+                conn, job_id,
+                state="failed", error=str(e), finished_at=time.time(),
+            )
+            return
+
+        update_import_job(
+            conn, job_id,
+            state="done",
+            processed=result["events"],
+            imported=result["imported"],
+            skipped=result["skipped_duplicates"],
+            result=json.dumps(result),
+            finished_at=time.time(),
+        )
+    finally:
+        release_db(conn)
+        shard.pool.release(data_conn)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
 
 
 # ---------- API: импорт ----------
@@ -349,11 +1358,88 @@ def aggregate_by_year(rows):
 @app.route("/import", methods=["POST"])
 def import_location_history():
     """
-    Принимает JSON как location-history.json
+    Принимает JSON как location-history.json (можно сжатый gzip, zip
+    или zstd — формат определяется по содержимому)
     и складывает сегменты в SQLite.
+
+    По умолчанию тело сохраняется на диск, импорт ставится в фоновую
+    очередь, а в ответ сразу уходит 202 с job_id; прогресс — в
+    /import/<job_id>.
+
+    ?sync=1 — импорт прямо в запросе (как раньше). Вместе с ?stream=1
+    тело не загружается в память целиком: события разбираются по одному
+    прямо из потока запроса.
+    ?workers=N — разбор и классификация в N процессах.
+    ?user_id= — импорт в файл БД этого пользователя (см. select_shard).
     """
-    data = request.get_json(force=True, silent=True)
+    try:
+        workers = int(request.args.get("workers", IMPORT_WORKERS))
+    except ValueError:
+        return jsonify({"error": "workers must be an integer"}), 400
+    workers = max(1, min(workers, os.cpu_count() or 1))
+
+    if request.args.get("sync") in ("1", "true"):
+        return import_location_history_sync(workers)
+
+    # Сам импорт меряет run_import_job, здесь — только приём тела
+    timings = request_timings("import")
+    with timings.stage("spool"):
+        path, size, digest = spool_upload(request.stream)
+    if size == 0:
+        os.remove(path)
+        return jsonify({"error": "Expected JSON body"}), 400
+
+    with timings.stage("enqueue"):
+        conn = shards.default.pool.acquire()
+        try:
+            job_id = create_import_job(conn, path)
+        finally:
+            release_db(conn)
+        import_executor.submit(
+            run_import_job, job_id, path, workers, digest, current_shard(),
+            time.monotonic(),
+        )
+
+    response = jsonify({
+        "job_id": job_id,
+        "state": "queued",
+        "status_url": "/import/%s" % job_id,
+    })
+    response.status_code = 202
+    response.headers["Location"] = "/import/%s" % job_id
+    return response
+
+
+@app.route("/import/<job_id>", methods=["GET"])
+def import_job_status(job_id):
+    conn = shards.default.pool.acquire()
+    try:
+        job = get_import_job(conn, job_id)
+    finally:
+        release_db(conn)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job)
+
+
+def import_location_history_sync(workers):
+    if request.args.get("stream") in ("1", "true"):
+        return import_location_history_stream(workers)
+
+    timings = request_timings("import")
+    with timings.stage("receive"):
+        body = request.get_data()
+    digest = hashlib.sha256(body).hexdigest()
+    conn = get_db()
+    already = find_imported_file(conn, digest)
+    if already is not None:
+        return jsonify(already)
+
+    with timings.stage("json_decode"):
+        data = request.get_json(force=True, silent=True)
     if data is None:
+        if detect_compression(body[:4]):
+            return import_compressed_body(body, digest, workers)
         return jsonify({"error": "Expected JSON body"}), 400
 
     if isinstance(data, dict):
@@ -367,39 +1453,41 @@ def import_location_history():
     if not isinstance(data, list):
         return jsonify({"error": "Expected JSON array"}), 400
 
-    conn = get_db()
-    cur = conn.cursor()
+    result = import_events(conn, data, workers=workers, timings=timings)
+    record_imported_file(conn, digest, result)
+    return jsonify(result)
 
-    imported = 0
-    skipped = 0
 
-    for ev in data:
-        row = event_to_row(ev)
-        if row is None:
-            continue
-        cur.execute(
-            """
-            INSERT OR IGNORE INTO segments
-            (start_time, end_time, start_date, activity_type,
-             distance_m, duration_s, speed_kmh)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            """,
-            row,
+def import_compressed_body(body, digest, workers):
+    conn = get_db()
+    try:
+        result = import_events(
+            conn, iter_history_events(io.BytesIO(body)), workers=workers,
+            timings=request_timings("import"),
         )
-        if cur.rowcount == 0:
-            skipped += 1
-        else:
-            imported += 1
+    except ValueError as e:
+        return jsonify({"error": "Invalid upload: %s" % e}), 400
 
-    conn.commit()
-    conn.close()
+    record_imported_file(conn, digest, result)
+    return jsonify(result)
 
-    return jsonify(
-        {
-            "imported": imported,
-            "skipped_duplicates": skipped,
-        }
-    )
+
+def import_location_history_stream(workers):
+    # Хэш файла известен только в конце: проверить заранее нельзя,
+    # но запомнить для следующих загрузок можно
+    conn = get_db()
+    reader = HashingReader(request.stream)
+    try:
+        result = import_events(
+            conn, iter_history_events(reader), workers=workers,
+            timings=request_timings("import"),
+        )
+    except ValueError as e:
+        # Уже записанные пачки остаются: повторный импорт их пропустит
+        return jsonify({"error": "Invalid JSON body: %s" % e}), 400
+
+    record_imported_file(conn, reader.hexdigest(), result)
+    return jsonify(result)
 
 
 # ---------- API: статистика ----------
@@ -407,7 +1495,10 @@ def import_location_history():
 @app.route("/stats", methods=["GET"])
 def get_stats():
     """
-    Возвращает статистику по велосипеду (activity_type='cycling').
+    Возвращает статистику по типу перемещения ?activity= (по умолчанию
+    велосипед, activity_type='cycling'). activity=all — по всем типам
+    за один проход: {"activities": {тип: статистика}}.
+    ?user_id= — по данным этого пользователя бота.
     """
     date_param = request.args.get("date")
     if date_param:
@@ -417,7 +1508,240 @@ def get_stats():
             return jsonify({"error": "date must be in format YYYY-MM-DD"}), 400
     else:
         base_date = date.today()
+    activity = request.args.get("activity", "cycling")
+
+    timings = request_timings("stats")
+    conn = get_db()
+    shard = current_shard()
+    if not known_activity(conn, activity):
+        return jsonify({"error": "unknown activity"}), 400
+    with timings.stage("generation"):
+        generation = get_data_generation(conn)
+
+    # Данные не менялись — фронтенду хватит 304
+    etag = stats_etag(
+        generation, str(shard.user_id), base_date.isoformat(), activity
+    )
+    if request.if_none_match.contains(etag):
+        METRICS.inc("stats_not_modified_total")
+        response = app.response_class(status=304)
+    else:
+        key = (base_date, generation, activity, shard.user_id)
+        with timings.stage("cache"):
+            payload = stats_cache.get(key)
+        if payload is None:
+            METRICS.inc("stats_cache_misses_total")
+            # Ожидание блокировки отдельно: её держат импорт и загрузка
+            with timings.stage("lock_wait"):
+                shard.store.lock.acquire()
+            try:
+                with timings.stage("store_load"):
+                    store = load_column_store(conn, generation, shard)
+                with timings.stage("compute"):
+                    if activity == ALL_ACTIVITIES:
+                        payload = {"activities": compute_stats_columnar(
+                            store, base_date, store.activities()
+                        )}
+                    else:
+                        payload = compute_stats_columnar(
+                            store, base_date, (activity,)
+                        )[activity]
+            finally:
+                shard.store.lock.release()
+            stats_cache.put(key, payload)
+        else:
+            METRICS.inc("stats_cache_hits_total")
+        with timings.stage("serialize"):
+            response = jsonify(payload)
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def known_activity(conn, activity):
+    """
+    activity из запроса: all, cycling или тип, который уже есть в БД.
+    Иначе каждая новая строка заводила бы свою запись в кэше /stats.
+    """
+    if activity in (ALL_ACTIVITIES, "cycling"):
+        return True
+    return conn.execute(
+        "SELECT 1 FROM activity_types WHERE name = ?", (activity,)
+    ).fetchone() is not None
+
+
+def stats_etag(generation, *params):
+    """
+    ETag ответов /stats*: поколение данных и хэш параметров запроса.
+    """
+    key = "|".join(params)
+    return "%d-%s" % (
+        generation, hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+    )
+
+
+RANGE_LABELS = {
+    "day": lambda d: d.isoformat(),
+    "week": lambda w: "%d-W%02d" % w,
+    "month": lambda m: "%d-%02d" % m,
+    "year": str,
+    "hour": lambda h: "%02d:00" % h,
+}
+
+# Сдвиг часового пояса для bucket=hour, минут
+RANGE_UTC_OFFSET_MIN = (-12 * 60, 14 * 60)
+
+
+@app.route("/stats/range", methods=["GET"])
+def get_stats_range():
+    """
+    Ряды по корзинам за произвольный период:
+    ?from=YYYY-MM-DD&to=YYYY-MM-DD&bucket=day|week|month|year|hour&activity=cycling
+    (и ?user_id=, как в /stats). Корзины идут без пропусков (пустые —
+    нули), крайние неполные. hour — час суток начала сегмента (00:00 ..
+    23:00) по сдвигу ?utc_offset= в минутах (по умолчанию 0 — UTC).
+    Несколько гранулярностей через запятую (bucket=week,hour) считаются
+    за один проход и приходят в {"buckets": {гранулярность: ряд}}.
+    """
+    try:
+        first = datetime.fromisoformat(request.args["from"]).date()
+        last = datetime.fromisoformat(request.args["to"]).date()
+    except Exception:
+        return jsonify({"error": "from and to must be in format YYYY-MM-DD"}), 400
+    if first > last:
+        return jsonify({"error": "from must not be after to"}), 400
+    if first < EARLIEST_EVENT_DATE:
+        return jsonify({
+            "error": "from must not be before %s" % EARLIEST_EVENT_DATE.isoformat()
+        }), 400
+    if (last - first).days >= STATS_RANGE_MAX_DAYS:
+        return jsonify({
+            "error": "range must be shorter than %d days" % STATS_RANGE_MAX_DAYS
+        }), 400
+
+    buckets = request.args.get("bucket", "day").split(",")
+    if len(set(buckets)) != len(buckets) or \
+            any(bucket not in RANGE_LABELS for bucket in buckets):
+        return jsonify({
+            "error": "bucket must be a list of: %s" % ", ".join(RANGE_LABELS)
+        }), 400
+    try:
+        utc_offset = int(request.args.get("utc_offset", "0"))
+    except ValueError:
+        utc_offset = None
+    if utc_offset is None or \
+            not RANGE_UTC_OFFSET_MIN[0] <= utc_offset <= RANGE_UTC_OFFSET_MIN[1]:
+        return jsonify({
+            "error": "utc_offset must be minutes between %d and %d" % RANGE_UTC_OFFSET_MIN
+        }), 400
+    activity = request.args.get("activity", "cycling")
+
+    timings = request_timings("stats_range")
+    conn = get_db()
+    shard = current_shard()
+    if not known_activity(conn, activity):
+        return jsonify({"error": "unknown activity"}), 400
+    generation = get_data_generation(conn)
+
+    etag = stats_etag(
+        generation, str(shard.user_id),
+        first.isoformat(), last.isoformat(), ",".join(buckets), activity,
+        str(utc_offset),
+    )
+    days = (day_number(first), day_number(last))
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    elif "hour" in buckets:
+        # Часов в дневных суммах нет: нужны сами сегменты, и по ним же
+        # за тот же проход — остальные гранулярности
+        with timings.stage("segments"):
+            columns = range_columns(conn, activity, *days)
+        with timings.stage("fold"):
+            folded = aggregate(
+                columns, buckets, utc_offset * 60, days, speed_range(activity)
+            )
+        with timings.stage("serialize"):
+            response = jsonify(range_payload(first, last, activity, buckets, folded))
+    else:
+        with timings.stage("store"), shard.store.lock:
+            store = load_column_store(conn, generation, shard)
+            daily = store.daily_range(*days, activity)
+        with timings.stage("fold"):
+            folded = {bucket: fold_days(days[0], daily, bucket) for bucket in buckets}
+        with timings.stage("serialize"):
+            response = jsonify(range_payload(first, last, activity, buckets, folded))
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
 
+def range_columns(conn, activity, first, last):
+    """
+    Сегменты типа activity за дни first..last (номера дней) колонками
+    для aggregate; читаются из покрывающего idx_segments_activity_day_ts.
+    Окно дат — как у load_column_store.
+    """
+    cur = conn.cursor()
+    cur.row_factory = None
+    cur.execute(
+        """
+        SELECT day, start_ts, distance_m, duration_s, speed_kmh
+        FROM segments
+        WHERE activity_id = (SELECT id FROM activity_types WHERE name = ?)
+          AND day BETWEEN ? AND ? AND start_ts <= ?
+        """,
+        (activity, first, last, time.time() + EVENT_MAX_AHEAD_S),
+    )
+    return segment_columns(cur.fetchall())
+
+
+def range_payload(first, last, activity, granularities, folded):
+    """
+    Ответ /stats/range: для одной гранулярности её ряд на верхнем
+    уровне, для нескольких — {"buckets": {гранулярность: ряд}}.
+    folded — {гранулярность: Buckets}.
+    """
+    payload = {
+        "from": first.isoformat(),
+        "to": last.isoformat(),
+        "activity": activity,
+    }
+    if len(granularities) == 1:
+        payload["bucket"] = granularities[0]
+        payload.update(range_series(folded[granularities[0]]))
+    else:
+        payload["buckets"] = {g: range_series(folded[g]) for g in granularities}
+    return payload
+
+
+def range_series(buckets):
+    """
+    Ряд /stats/range из Buckets: километры, средняя скорость (по
+    сегментам в диапазоне скоростей типа) и максимальная скорость.
+    """
+    hours = buckets.dur_s_speed / 3600.0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        average = np.where(hours > 0, buckets.dist_m_speed / 1000.0 / hours, 0.0)
+    if buckets.granularity == "day":
+        labels = buckets.keys.astype("datetime64[D]").astype(str).tolist()
+    else:
+        to_label = RANGE_LABELS[buckets.granularity]
+        labels = [to_label(label) for label in buckets.labels]
+    return {
+        "labels": labels,
+        "distance_km": np.round(buckets.dist_m_total / 1000.0, 2).tolist(),
+        "average_speed": np.round(average, 2).tolist(),
+        "max_speed": np.round(buckets.max_speed, 2).tolist(),
+        "segments": buckets.count.astype(np.int64).tolist(),
+    }
+
+
+def _stats_dates(base_date):
+    """
+    Границы периодов /stats: (вчера, неделя, месяц, год).
+    """
     yesterday = base_date - timedelta(days=1)
 
     # Неделя (понедельник–воскресенье)
@@ -436,63 +1760,76 @@ def get_stats():
     year_start = date(base_date.year, 1, 1)
     year_end = date(base_date.year, 12, 31)
 
-    conn = get_db()
-    cur = conn.cursor()
+    return (yesterday, week_start, week_end, month_start, month_end,
+            year_start, year_end)
 
-    # Берём минимум для day/week, чтобы неделя покрывалась полностью
-    query_start = min(yesterday, week_start)
 
-    # Для day_progress / week
-    cur.execute(
-        """
-        SELECT start_date, distance_m, duration_s, speed_kmh
-        FROM segments
-        WHERE start_date BETWEEN ? AND ?
-          AND activity_type = 'cycling'
-        """,
-        (query_start.isoformat(), week_end.isoformat()),
-    )
-    day_rows = cur.fetchall()
-    by_date = aggregate_by_date(day_rows)
+# Суммы по дню/периоду, из которых собирается ответ /stats
+STATS_FIELDS = ("dist_m_total", "dist_m_speed", "dur_s_speed", "max_speed")
 
-    # Для mounth_travel и average_max_speed.mouth
-    cur.execute(
-        """
-        SELECT start_date, distance_m, duration_s, speed_kmh
-        FROM segments
-        WHERE start_date BETWEEN ? AND ?
-          AND activity_type = 'cycling'
-        """,
-        (month_start.isoformat(), month_end.isoformat()),
-    )
-    month_rows = cur.fetchall()
-    by_date_for_month = aggregate_by_date(month_rows)
 
-    # Для year_travel и average_max_speed.year
-    cur.execute(
-        """
-        SELECT start_date, distance_m, duration_s, speed_kmh
-        FROM segments
-        WHERE start_date BETWEEN ? AND ?
-          AND activity_type = 'cycling'
-        """,
-        (year_start.isoformat(), year_end.isoformat()),
-    )
-    year_rows = cur.fetchall()
-    by_month_for_year = aggregate_by_month(year_rows)
+def compute_stats_columnar(store, base_date, activities=("cycling",)):
+    """
+    Ответ /stats по плотным суммам ColumnStore сразу для нескольких
+    типов: {тип: ответ /stats}. Берутся только ~45 дней, 12 месяцев
+    и по одному срезу на год, и каждый срез — сразу по всем типам,
+    сколько бы сегментов и типов ни было. Вызывать под store.lock.
+    """
+    (yesterday, week_start, week_end, month_start, month_end,
+     _, _) = _stats_dates(base_date)
 
-    # Для years / alltime
-    cur.execute(
-        """
-        SELECT start_date, distance_m, duration_s, speed_kmh
-        FROM segments
-        WHERE activity_type = 'cycling'
-        """
-    )
-    all_rows = cur.fetchall()
-    by_year_all = aggregate_by_year(all_rows)
+    # id типа -> (by_date, by_month_for_year, by_year_all)
+    parts = {
+        store.activity_ids[a]: ({}, {}, {})
+        for a in activities if a in store.activity_ids
+    }
+    slots = list(parts)
+
+    def collect(which, key, sums):
+        # sums — поле -> массив по id типа
+        for i in slots:
+            if sums["count"][i]:
+                parts[i][which][key] = {
+                    name: float(sums[name][i]) for name in STATS_FIELDS
+                }
+
+    for first, last in ((min(yesterday, week_start), week_end),
+                        (month_start, month_end)):
+        first = day_number(first)
+        daily = store.daily_range(first, day_number(last))
+        for j in np.flatnonzero(daily["count"][slots].any(axis=0)):
+            collect(0, day_date(first + int(j)),
+                    {name: values[:, j] for name, values in daily.items()})
+
+    year = base_date.year
+    for m in range(1, 13):
+        first = date(year, m, 1)
+        last = date(year + 1, 1, 1) if m == 12 else date(year, m + 1, 1)
+        collect(1, (year, m), store.period(day_number(first), day_number(last) - 1))
+
+    if store.size:
+        first_year = day_date(store.first_day).year
+        last_year = day_date(store.last_day).year
+        for y in range(first_year, last_year + 1):
+            collect(2, y, store.period(
+                day_number(date(y, 1, 1)), day_number(date(y, 12, 31))
+            ))
+
+    return {
+        a: stats_payload(
+            base_date, *parts.get(store.activity_ids.get(a), ({}, {}, {}))
+        )
+        for a in activities
+    }
 
-    conn.close()
+
+def stats_payload(base_date, by_date, by_month_for_year, by_year_all):
+    """
+    Ответ /stats из сумм по дням (by_date — хотя бы неделя, вчера и
+    месяц base_date), по месяцам года base_date и по всем годам.
+    """
+    (yesterday, week_start, week_end, month_start, month_end,
+     year_start, year_end) = _stats_dates(base_date)
 
     # ---------- day_progress ----------
     def km_for(d):
@@ -522,7 +1859,7 @@ def get_stats():
     days_in_month = (month_end - month_start).days + 1
     month_days = [month_start + timedelta(days=i) for i in range(days_in_month)]
     month_data = [
-        round(by_date_for_month.get(d, {"dist_m_total": 0})["dist_m_total"] / 1000.0, 2)
+        round(by_date.get(d, {"dist_m_total": 0})["dist_m_total"] / 1000.0, 2)
         for d in month_days
     ]
     mounth_travel = {
@@ -586,7 +1923,7 @@ def get_stats():
     # week / month / year — массивы значений для графиков
     week_avg_values, week_max_values = avg_max_arrays_for_days(week_days, by_date)
     mouth_avg_values, mouth_max_values = avg_max_arrays_for_days(
-        month_days, by_date_for_month
+        month_days, by_date
     )
 
     max_month = base_date.month
@@ -662,7 +1999,7 @@ def get_stats():
     month_dur_s_speed = 0.0
     month_max_speed_val = 0.0
     for d in month_days:
-        info = by_date_for_month.get(d)
+        info = by_date.get(d)
         if not info:
             continue
         month_total_dist_m += info["dist_m_total"]
@@ -826,7 +2163,7 @@ def get_stats():
         "alltime": summary_alltime,
     }
 
-    response = {
+    return {
         "day_progress": day_progress,
         "week_travel": week_travel,
         "mounth_travel": mounth_travel,
@@ -836,7 +2173,64 @@ def get_stats():
         "summary": summary,
     }
 
-    return jsonify(response)
+
+# ---------- API: метрики ----------
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """
+    Счётчики и время стадий импорта и /stats этого процесса
+    в текстовом формате Prometheus.
+    """
+    return app.response_class(
+        METRICS.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+# ---------- API: профили запросов ----------
+
+@app.route("/profiles", methods=["GET"])
+def list_profiles():
+    """
+    Сохранённые профили, новые первыми (нужен токен, как для записи).
+    """
+    if not profile_token_ok():
+        return jsonify({"error": "Not found"}), 404
+    return jsonify({"profiles": profiles.list()})
+
+
+@app.route("/profiles/<profile_id>", methods=["GET"])
+def get_profile(profile_id):
+    """
+    Файл .prof (python -m pstats, snakeviz). ?format=text — таблица
+    pstats прямо в ответе: ?sort= (cumulative, tottime, ...), ?limit=.
+    """
+    if not profile_token_ok():
+        return jsonify({"error": "Not found"}), 404
+
+    if request.args.get("format") == "text":
+        sort = request.args.get("sort", "cumulative")
+        if sort not in PROFILE_SORT_KEYS:
+            return jsonify({
+                "error": "sort must be one of: %s" % ", ".join(PROFILE_SORT_KEYS)
+            }), 400
+        try:
+            limit = int(request.args.get("limit", "50"))
+        except ValueError:
+            return jsonify({"error": "limit must be an integer"}), 400
+        text = profiles.text(profile_id, sort, limit)
+        if text is None:
+            return jsonify({"error": "Unknown profile"}), 404
+        return app.response_class(text, content_type="text/plain; charset=utf-8")
+
+    path = profiles.path(profile_id)
+    if path is None:
+        return jsonify({"error": "Unknown profile"}), 404
+    # send_file считает относительные пути от папки приложения, а не от cwd
+    return send_file(
+        os.path.abspath(path), mimetype="application/octet-stream",
+        as_attachment=True, download_name=profile_id + ".prof",
+    )
 
 
 if __name__ == "__main__":
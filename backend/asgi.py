@@ -0,0 +1,74 @@
+# asgi.py
+"""
+ASGI-вход для uvicorn: те же обработчики /import и /stats из app.py,
+но сервер — uvicorn с несколькими рабочими процессами вместо
+отладочного app.run().
+
+Обработчики остаются синхронными (Flask + sqlite3). Каждый запрос
+выполняется в пуле потоков, цикл событий uvicorn их не ждёт. Пулов
+два: POST /import (разбор файла и запись в SQLite) идёт в свой
+маленький пул, всё остальное — в пул чтений. Медленный импорт
+не занимает потоки, которые отвечают дашборду.
+
+Запуск из папки backend:
+    python asgi.py
+или
+    uvicorn asgi:app --workers 4
+
+У каждого процесса своё колоночное хранилище и кэш ответов. Чужой
+импорт процесс замечает по поколению данных в файле БД и дочитывает
+только строки новых поколений (segments.gen), задачи
+фонового импорта лежат в import_jobs основного файла — статус виден
+из любого процесса. Фоновый импорт выполняется в том процессе, который
+принял файл. Если процесс упал, uvicorn запускает новый, и при старте
+тот помечает задачи умерших процессов failed (см. app.fail_orphaned_jobs).
+Такую загрузку нужно отправить заново.
+"""
+
+import os
+
+from a2wsgi import WSGIMiddleware
+
+import app as flask_app
+
+ASGI_WORKERS = int(os.getenv("ASGI_WORKERS", str(os.cpu_count() or 1)))
+# Потоков на процесс: чтения (/stats, /stats/range, статус задач)
+# и синхронная часть POST /import
+READ_THREADS = int(os.getenv("ASGI_READ_THREADS", "16"))
+IMPORT_THREADS = int(os.getenv("ASGI_IMPORT_THREADS", "2"))
+
+reads = WSGIMiddleware(flask_app.app, workers=READ_THREADS)
+imports = WSGIMiddleware(flask_app.app, workers=IMPORT_THREADS)
+
+
+async def lifespan(receive, send):
+    message = await receive()
+    if message["type"] == "lifespan.startup":
+        # Схему создаёт каждый процесс; задачи живых соседей не трогаем
+        flask_app.init_db(fail_interrupted=False)
+        await send({"type": "lifespan.startup.complete"})
+        message = await receive()
+    if message["type"] == "lifespan.shutdown":
+        flask_app.shards.close_all()
+        await send({"type": "lifespan.shutdown.complete"})
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+    if scope["type"] == "http" and scope["method"] == "POST" and scope["path"] == "/import":
+        return await imports(scope, receive, send)
+    return await reads(scope, receive, send)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    # Незавершённые задачи прошлого запуска — один раз, до старта процессов
+    flask_app.init_db()
+    uvicorn.run(
+        "asgi:app",
+        host=os.getenv("HOST", "127.0.0.1"),
+        port=int(os.getenv("PORT", "5000")),
+        workers=ASGI_WORKERS,
+    )
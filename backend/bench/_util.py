@@ -0,0 +1,17 @@
+# bench/_util.py
+"""
+Общие помощники бенчмарков.
+"""
+
+import time
+
+
+def timeit(fn, repeat=20):
+    """
+    Среднее время вызова fn в мс (первый вызов — прогрев, не считается).
+    """
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat * 1000
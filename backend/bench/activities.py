@@ -0,0 +1,49 @@
+# bench/activities.py
+"""
+/stats по всем типам перемещений за один раз (activity=all) против
+одного велосипеда и против отдельного расчёта на каждый тип.
+
+Запуск из папки backend:
+    python -m bench.activities [segments]
+"""
+
+import sys
+from datetime import date
+
+import app
+from bench._util import timeit
+from bench.synthetic import segment_rows, store_rows
+from segment_store import ColumnStore
+
+REPEAT = 50
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    years = 20
+    rows, activities = store_rows(
+        segment_rows(years=years, per_day=max(1, total // (365 * years)))
+    )
+    base_date = date(2025, 6, 15)
+
+    store = ColumnStore()
+    store.load(0, rows, activities)
+    names = store.activities()
+
+    single_ms = timeit(lambda: app.compute_stats_columnar(store, base_date), REPEAT)
+    all_ms = timeit(lambda: app.compute_stats_columnar(store, base_date, names), REPEAT)
+    separate_ms = timeit(lambda: [
+        app.compute_stats_columnar(store, base_date, (name,)) for name in names
+    ], REPEAT)
+    combined = app.compute_stats_columnar(store, base_date, names)
+    same = all(
+        combined[name] == app.compute_stats_columnar(store, base_date, (name,))[name]
+        for name in names
+    )
+
+    print("segments: %d, activity types: %d" % (store.size, len(names)))
+    print("cycling only:                 %8.3f ms" % single_ms)
+    print("all types, one pass:          %8.3f ms (%.2fx cycling only)" % (
+        all_ms, all_ms / single_ms))
+    print("all types, call per type:     %8.3f ms" % separate_ms)
+    print("same per-type payloads: %s" % same)
@@ -0,0 +1,132 @@
+# bench/aggregate.py
+"""
+Стоимость агрегации на строку: прежние циклы aggregate_by_date /
+aggregate_by_month / aggregate_by_year (dict на корзину и
+datetime.fromisoformat на строку) против того, как их теперь считает
+/stats/range: загрузка строк в ColumnStore (плотные суммы по дням) и
+fold_days — по одной гранулярности и всех сразу после одной загрузки;
+и aggregate() по колонкам сегментов — все гранулярности вместе с часом
+суток за один проход (так /stats/range считает bucket=hour).
+
+Запуск из папки backend:
+    python -m bench.aggregate [segments]
+"""
+
+import sys
+import time
+from datetime import date, datetime
+
+from aggregate import EPOCH_ORDINAL, GRANULARITIES, aggregate, fold_days, segment_columns
+from bench.synthetic import segment_rows
+from constants import BIKE_SPEED_MIN_KMH, BIKE_SPEED_MAX_KMH
+from segment_store import ColumnStore
+
+
+def legacy_aggregate(rows, key_fn):
+    """
+    Прежний цикл aggregate_by_* (они отличались только ключом).
+    """
+    result = {}
+    for r in rows:
+        d = datetime.fromisoformat(r["start_date"]).date()
+        key = key_fn(d)
+        dist_m = float(r["distance_m"])
+        dur_s = float(r["duration_s"])
+        speed = float(r["speed_kmh"])
+
+        info = result.get(key)
+        if info is None:
+            info = {
+                "dist_m_total": 0.0,
+                "dist_m_speed": 0.0,
+                "dur_s_speed": 0.0,
+                "max_speed": 0.0,
+            }
+            result[key] = info
+
+        info["dist_m_total"] += dist_m
+        if BIKE_SPEED_MIN_KMH <= speed <= BIKE_SPEED_MAX_KMH:
+            info["dist_m_speed"] += dist_m
+            info["dur_s_speed"] += dur_s
+            if speed > info["max_speed"]:
+                info["max_speed"] = speed
+    return result
+
+
+LEGACY_KEYS = {
+    "day": lambda d: d,
+    "month": lambda d: (d.year, d.month),
+    "year": lambda d: d.year,
+}
+
+
+def engine(rows, granularities):
+    """
+    Все строки — одним типом и с диапазоном скоростей велосипеда,
+    как в прежних циклах.
+    """
+    store = ColumnStore()
+    store.load(0, rows, {"cycling": 0})
+    daily = store.daily_range(store.first_day, store.last_day, "cycling")
+    return {g: fold_days(store.first_day, daily, g) for g in granularities}
+
+
+def ns_per_row(fn, n, repeat=3):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / n * 1e9
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    years = 10
+    rows = segment_rows(years=years, per_day=max(1, total // (365 * years)))
+    n = len(rows)
+
+    dict_rows = [
+        {
+            "start_date": date.fromordinal(r[2] + EPOCH_ORDINAL).isoformat(),
+            "distance_m": r[4],
+            "duration_s": r[5],
+            "speed_kmh": r[6],
+        }
+        for r in rows
+    ]
+    store_rows = [(0, r[2], r[4], r[5], r[6]) for r in rows]
+    columns = segment_columns([(r[2], r[0], r[4], r[5], r[6]) for r in rows])
+
+    # Совпадает ли результат (ключи и суммы с точностью до округления)
+    legacy = legacy_aggregate(dict_rows, LEGACY_KEYS["month"])
+    folded = engine(store_rows, ("month",))["month"].as_dict()
+    one_pass = aggregate(columns, ("month",))["month"].nonempty().as_dict()
+    same = all(
+        legacy.keys() == result.keys() and all(
+            abs(legacy[k]["dist_m_total"] - result[k]["dist_m_total"]) < 1e-6
+            and legacy[k]["max_speed"] == result[k]["max_speed"]
+            for k in legacy
+        )
+        for result in (folded, one_pass)
+    )
+
+    print("segments: %d" % n)
+    for g, key_fn in LEGACY_KEYS.items():
+        print("%-6s legacy loop %8.1f ns/row   engine %6.1f ns/row" % (
+            g,
+            ns_per_row(lambda: legacy_aggregate(dict_rows, key_fn), n),
+            ns_per_row(lambda: engine(store_rows, (g,)), n),
+        ))
+    print("day+month+year: 3 legacy loops %.1f ns/row; "
+          "engine, day+week+month+year from one load %.1f ns/row" % (
+        ns_per_row(lambda: [legacy_aggregate(dict_rows, f) for f in LEGACY_KEYS.values()], n),
+        ns_per_row(lambda: engine(store_rows, ("day", "week", "month", "year")), n),
+    ))
+    print("aggregate(), day+week+month+year+hour in one pass %.1f ns/row; "
+          "hour of day alone %.1f ns/row" % (
+        ns_per_row(lambda: aggregate(columns, GRANULARITIES), n),
+        ns_per_row(lambda: aggregate(columns, ("hour",)), n),
+    ))
+    print("same month sums as legacy: %s" % same)
@@ -0,0 +1,117 @@
+# bench/classify.py
+"""
+Сверка и замер: скалярная classify_activity против classify_activity_batch.
+
+Запуск из папки backend:
+    python -m bench.classify [N]
+"""
+
+import random
+import sys
+import time
+
+import numpy as np
+
+import app
+import classify_batch
+import geo
+from bench.synthetic import RAW_TYPES
+from constants import BIKE_PRIORITY_LOCATIONS, SCOOTER_A, SCOOTER_B, SCOOTER_PARKING
+
+
+def random_segments(n, seed=1):
+    """
+    Точки вокруг особых локаций (часть — на границе радиуса),
+    часть — далеко, часть — без координат.
+    """
+    rnd = random.Random(seed)
+    centers = [SCOOTER_A, SCOOTER_B, SCOOTER_PARKING] + BIKE_PRIORITY_LOCATIONS
+    centers = [(c["lat"], c["lon"]) for c in centers] + [(47.60, 9.80)]
+
+    def point():
+        if rnd.random() < 0.02:
+            return None, None
+        lat, lon = rnd.choice(centers)
+        return lat + rnd.uniform(-0.0015, 0.0015), lon + rnd.uniform(-0.002, 0.002)
+
+    segments = []
+    for _ in range(n):
+        start_lat, start_lon = point()
+        end_lat, end_lon = point()
+        segments.append((
+            rnd.choice(RAW_TYPES),
+            rnd.uniform(0, 40),
+            start_lat, start_lon, end_lat, end_lon,
+        ))
+    return segments
+
+
+def run_scalar(segments):
+    return [
+        app.classify_activity(raw, speed, s_lat, s_lon, e_lat, e_lon)
+        for raw, speed, s_lat, s_lon, e_lat, e_lon in segments
+    ]
+
+
+def run_batch(segments):
+    raw, speed, s_lat, s_lon, e_lat, e_lon = zip(*segments)
+    return classify_batch.classify_activity_batch(
+        raw,
+        speed,
+        np.array(s_lat, dtype=float),
+        np.array(s_lon, dtype=float),
+        np.array(e_lat, dtype=float),
+        np.array(e_lon, dtype=float),
+    )
+
+
+def set_bus_stops(stops):
+    index = geo.LocationIndex(stops, geo.BUS_RADIUS_M)
+    app.BUS_STOPS = stops
+    app.BUS_STOPS_INDEX = index
+    classify_batch.BUS_STOPS = stops
+    classify_batch.BUS_STOPS_INDEX = index
+    classify_batch.BUS_POINTS = classify_batch._points(stops)
+
+
+def compare(segments, title):
+    t0 = time.perf_counter()
+    scalar = run_scalar(segments)
+    t1 = time.perf_counter()
+    batch = run_batch(segments)
+    t2 = time.perf_counter()
+
+    mismatches = [i for i, (a, b) in enumerate(zip(scalar, batch)) if a != b]
+    print(
+        "%-22s n=%d scalar=%.3fs batch=%.3fs x%.1f mismatches=%d"
+        % (title, len(segments), t1 - t0, t2 - t1, (t1 - t0) / (t2 - t1), len(mismatches))
+    )
+    return not mismatches
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    segments = random_segments(n)
+
+    ok = compare(segments, "constants")
+
+    # Правила автобуса с пустым BUS_STOPS не срабатывают — проверяем и их
+    stops = [
+        {"name": "stop_%d" % i, "lat": c["lat"] + 0.0004, "lon": c["lon"]}
+        for i, c in enumerate(BIKE_PRIORITY_LOCATIONS)
+    ]
+    set_bus_stops(stops)
+    ok = compare(segments, "with bus stops") and ok
+
+    # Много остановок — пакетный путь уходит в LocationIndex
+    rnd = random.Random(2)
+    stops = [
+        {"name": "stop_%d" % i,
+         "lat": 47.54 + rnd.uniform(0, 0.03),
+         "lon": 9.68 + rnd.uniform(0, 0.05)}
+        for i in range(500)
+    ]
+    set_bus_stops(stops)
+    ok = compare(segments, "500 bus stops") and ok
+
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,57 @@
+# bench/columnar.py
+"""
+Колоночное хранилище на миллионах сегментов: загрузка целиком,
+дописывание пачками импорта и /stats (велосипед) по нему.
+
+Запуск из папки backend:
+    python -m bench.columnar [segments]
+"""
+
+import sys
+import time
+from datetime import date
+
+import app
+from aggregate import fold_days
+from bench._util import timeit
+from bench.synthetic import segment_rows, store_rows
+from segment_store import ColumnStore
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    years = 20
+    per_day = max(1, total // (365 * years))
+
+    rows, activities = store_rows(segment_rows(years=years, per_day=per_day))
+    base_date = date(2025, 6, 15)
+
+    store = ColumnStore()
+    started = time.perf_counter()
+    store.load(0, rows, activities)
+    load_s = time.perf_counter() - started
+
+    # Дописывание пачками, как при импорте
+    appended = ColumnStore()
+    appended.load(0, rows[:1], activities)
+    started = time.perf_counter()
+    for i in range(1, len(rows), app.IMPORT_BATCH_SIZE):
+        appended.append(rows[i:i + app.IMPORT_BATCH_SIZE], activities)
+    append_s = time.perf_counter() - started
+
+    columnar_ms = timeit(lambda: app.compute_stats_columnar(store, base_date))
+    by_month_ms = timeit(lambda: fold_days(
+        store.first_day,
+        store.daily_range(store.first_day, store.last_day, "cycling"),
+        "month",
+    ))
+    # Дописанное пачками должно совпасть с загруженным целиком
+    same = app.compute_stats_columnar(store, base_date) == \
+        app.compute_stats_columnar(appended, base_date)
+
+    print("segments: %d" % store.size)
+    print("load into store:               %8.3f s" % load_s)
+    print("append in import batches:      %8.3f s" % append_s)
+    print("compute_stats_columnar:        %8.3f ms" % columnar_ms)
+    print("all months (fold_days):        %8.3f ms" % by_month_ms)
+    print("same payload: %s" % same)
@@ -0,0 +1,44 @@
+# bench/dedup.py
+"""
+Повторный импорт той же выгрузки: отсев по хэшам событий до разбора
+против старого пути (разбор, классификация и INSERT OR IGNORE).
+
+Запуск из папки backend:
+    python -m bench.dedup path/to/location-history.json
+"""
+
+import os
+import sys
+import tempfile
+
+import app
+from history_stream import iter_events_from_file
+
+
+def reimport(conn, events):
+    result = app.import_events(conn, events)
+    return result["elapsed_s"], result["skipped_duplicates"]
+
+
+if __name__ == "__main__":
+    events = list(iter_events_from_file(sys.argv[1]))
+
+    workdir = tempfile.mkdtemp()
+    app.configure_db(os.path.join(workdir, "travel.db"))
+    app.init_db()
+    conn = app.get_db()
+
+    first = app.import_events(conn, events)
+    hashed_s, skipped = reimport(conn, events)
+
+    # Без хэшей всё идёт старым путём и отсеивается только UNIQUE
+    conn.execute("DELETE FROM event_hashes")
+    conn.execute("UPDATE meta SET value = 0 WHERE key = 'events_watermark'")
+    conn.commit()
+    plain_s, plain_skipped = reimport(conn, events)
+
+    print("events: %d, segments: %d" % (len(events), first["imported"]))
+    print("first import:                %8.3f s" % first["elapsed_s"])
+    print("re-import, INSERT OR IGNORE: %8.3f s (skipped %d)" % (plain_s, plain_skipped))
+    print("re-import, event hashes:     %8.3f s (skipped %d)" % (hashed_s, skipped))
+    app.release_db(conn)
@@ -0,0 +1,197 @@
+# bench/http_load.py
+"""
+Нагрузочный тест по HTTP: отладочный сервер Flask (app.run, как в
+python app.py) против uvicorn с несколькими процессами (asgi.py).
+
+Оба сервера поднимаются на копиях одной временной БД. Два сценария:
+  reads          — CONCURRENCY клиентов бьют в /stats со случайной датой;
+  reads + import — то же, пока отдельный клиент подряд шлёт
+                   POST /import?sync=1, каждый раз со свежими событиями
+                   (свой seed генератора), так что все они действительно
+                   пишутся в БД, а не отсеиваются как дубликаты.
+Для каждого — запросов /stats в секунду, медиана и p99 задержки,
+сколько прошло импортов и сколько строк они добавили.
+
+Запуск из папки backend:
+    python -m bench.http_load [seconds] [concurrency] [uvicorn_workers]
+"""
+
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import aiohttp
+
+import app
+from bench.synthetic import segment_rows, timeline_events
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EVENTS_PER_IMPORT = 20_000
+# seed генератора для первого импорта, дальше — по одному на импорт
+IMPORT_SEED = 100
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def flask_command(port):
+    return [
+        sys.executable, "-c",
+        "import app; app.init_db(); "
+        "app.app.run(port=%d, debug=True, use_reloader=False)" % port,
+    ]
+
+
+def uvicorn_command(port, workers):
+    return [
+        sys.executable, "-m", "uvicorn", "asgi:app",
+        "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+    ]
+
+
+def start_server(command, workdir, port):
+    """
+    Сервер в workdir (там travel.db): пути к БД в app.py относительные.
+    """
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+    process = subprocess.Popen(
+        command, cwd=workdir, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("server did not start: %s" % " ".join(command))
+
+
+def random_date(rnd):
+    return (date(2016, 1, 1) + timedelta(days=rnd.randint(0, 3650))).isoformat()
+
+
+async def reader(session, base_url, deadline, latencies, seed):
+    rnd = random.Random(seed)
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        async with session.get(base_url + "/stats?date=" + random_date(rnd)) as response:
+            await response.read()
+            assert response.status == 200, response.status
+        latencies.append((time.perf_counter() - started) * 1000)
+
+
+def import_payload(seed):
+    return json.dumps(timeline_events(EVENTS_PER_IMPORT, seed=seed)).encode()
+
+
+async def importer(session, base_url, deadline, totals):
+    # Тело следующего импорта готовит отдельный процесс, пока уходит
+    # текущее: генерация не отнимает GIL у клиентов /stats
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        seed = IMPORT_SEED
+        pending = loop.run_in_executor(executor, import_payload, seed)
+        while time.monotonic() < deadline:
+            body = await pending
+            seed += 1
+            pending = loop.run_in_executor(executor, import_payload, seed)
+            async with session.post(base_url + "/import?sync=1", data=body) as response:
+                result = await response.json()
+                assert response.status == 200, response.status
+            totals["imports"] += 1
+            totals["imported"] += result["imported"]
+        await pending
+
+
+async def run_scenario(base_url, seconds, concurrency, with_import=False):
+    latencies = []
+    totals = {"imports": 0, "imported": 0}
+    connector = aiohttp.TCPConnector(limit=concurrency + 1)
+    timeout = aiohttp.ClientTimeout(total=None)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        # Прогрев: хранилище загружено в каждом процессе
+        for _ in range(concurrency):
+            async with session.get(base_url + "/stats") as response:
+                await response.read()
+
+        deadline = time.monotonic() + seconds
+        started = time.monotonic()
+        tasks = [
+            reader(session, base_url, deadline, latencies, seed)
+            for seed in range(concurrency)
+        ]
+        if with_import:
+            tasks.append(importer(session, base_url, deadline, totals))
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - started
+
+    latencies.sort()
+    return {
+        "requests_per_s": len(latencies) / elapsed,
+        "median_ms": statistics.median(latencies),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1],
+        "imports": totals["imports"],
+        "imported": totals["imported"],
+    }
+
+
+def prepare_workdir():
+    workdir = tempfile.mkdtemp()
+    app.configure_db(os.path.join(workdir, "travel.db"))
+    app.init_db()
+    conn = app.get_db()
+    app.write_segments(conn, segment_rows(years=10))
+    app.release_db(conn)
+    app.shards.close_all()
+    return workdir
+
+
+if __name__ == "__main__":
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count() or 1
+
+    template = prepare_workdir()
+
+    servers = [
+        ("flask dev server", flask_command),
+        ("uvicorn x%d" % workers, lambda port: uvicorn_command(port, workers)),
+    ]
+    print("concurrency %d, %.0f s per scenario" % (concurrency, seconds))
+    for title, command in servers:
+        # Каждому серверу — своя копия БД: импорты первого не влияют на второй
+        workdir = tempfile.mkdtemp()
+        shutil.copyfile(os.path.join(template, "travel.db"), os.path.join(workdir, "travel.db"))
+        port = free_port()
+        process = start_server(command(port), workdir, port)
+        try:
+            base_url = "http://127.0.0.1:%d" % port
+            for scenario, with_import in (("reads", False), ("reads + import", True)):
+                result = asyncio.run(
+                    run_scenario(base_url, seconds, concurrency, with_import)
+                )
+                print(
+                    "%-18s %-15s %8.1f req/s  median %7.2f ms  p99 %8.2f ms"
+                    "  imports %d (%d rows)"
+                    % (title, scenario, result["requests_per_s"], result["median_ms"],
+                       result["p99_ms"], result["imports"], result["imported"])
+                )
+        finally:
+            process.terminate()
+            process.wait()
@@ -0,0 +1,51 @@
+# bench/range.py
+"""
+/stats/range на многолетних периодах: дневные, недельные и месячные
+ряды для велосипеда и для другого типа (оба — срезы плотных сумм
+ColumnStore) и ряд по часам суток (проход по сегментам периода из
+покрывающего индекса).
+
+Запуск из папки backend:
+    python -m bench.range [segments]
+"""
+
+import os
+import sys
+import tempfile
+
+import app
+from bench._util import timeit
+from bench.synthetic import segment_rows
+
+
+if __name__ == "__main__":
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    years = 20
+    rows = segment_rows(years=years, per_day=max(1, total // (365 * years)))
+
+    workdir = tempfile.mkdtemp()
+    app.configure_db(os.path.join(workdir, "travel.db"))
+    app.init_db()
+    conn = app.get_db()
+    for i in range(0, len(rows), app.IMPORT_BATCH_SIZE):
+        app.write_segments(conn, rows[i:i + app.IMPORT_BATCH_SIZE])
+    app.release_db(conn)
+
+    client = app.app.test_client()
+    last = app.day_number(app.date(2025, 12, 31))
+    print("segments: %d over %d years" % (len(rows), years))
+    for activity in ("cycling", "walking"):
+        expected = sum(
+            r[4] for r in rows if r[3] == activity and r[2] <= last
+        ) / 1000.0
+        for bucket in ("day", "week", "month", "hour"):
+            url = (
+                "/stats/range?from=2005-01-01&to=2025-12-31"
+                "&bucket=%s&activity=%s" % (bucket, activity)
+            )
+            ms = timeit(lambda: client.get(url), repeat=10)
+            payload = client.get(url).get_json()
+            print("%-8s %-6s %6d buckets %8.2f ms   total km matches: %s" % (
+                activity, bucket, len(payload["labels"]), ms,
+                abs(sum(payload["distance_km"]) - expected) < len(payload["labels"]) * 0.01,
+            ))
@@ -0,0 +1,58 @@
+# bench/spatial.py
+"""
+Стоимость поиска "есть ли остановка в радиусе" в зависимости от числа
+остановок: линейный is_near_any против LocationIndex.
+
+Запуск из папки backend:
+    python -m bench.spatial
+"""
+
+import random
+import time
+
+from constants import BUS_RADIUS_M
+from geo import LocationIndex, is_near_any
+
+# Примерно границы города из constants.py
+LAT_RANGE = (47.50, 47.62)
+LON_RANGE = (9.62, 9.80)
+
+QUERIES = 20_000
+
+
+def random_points(n, rnd):
+    return [
+        {"lat": rnd.uniform(*LAT_RANGE), "lon": rnd.uniform(*LON_RANGE)}
+        for _ in range(n)
+    ]
+
+
+def run(n_stops, rnd):
+    stops = random_points(n_stops, rnd)
+    queries = random_points(QUERIES, rnd)
+
+    t0 = time.perf_counter()
+    index = LocationIndex(stops, BUS_RADIUS_M)
+    build_s = time.perf_counter() - t0
+
+    # Линейный перебор на больших списках слишком долгий — меряем на части
+    linear_queries = queries[: max(200, QUERIES * 50 // max(n_stops, 1))]
+    t0 = time.perf_counter()
+    linear = [is_near_any(q["lat"], q["lon"], stops, BUS_RADIUS_M) for q in linear_queries]
+    linear_us = (time.perf_counter() - t0) / len(linear_queries) * 1e6
+
+    t0 = time.perf_counter()
+    indexed = [index.near_any(q["lat"], q["lon"]) for q in queries]
+    index_us = (time.perf_counter() - t0) / len(queries) * 1e6
+
+    assert indexed[: len(linear)] == linear, "LocationIndex disagrees with is_near_any"
+    print(
+        "%7d stops: linear %9.2f us/query, index %6.2f us/query, build %.3fs"
+        % (n_stops, linear_us, index_us, build_s)
+    )
+
+
+if __name__ == "__main__":
+    rnd = random.Random(1)
+    for n in (5, 50, 500, 5_000, 50_000):
+        run(n, rnd)
@@ -0,0 +1,90 @@
+# bench/stats.py
+"""
+/stats: четыре пересекающихся запроса по segments (как было раньше)
+против колоночного хранилища — с загрузкой из segments (первый запрос
+после запуска или чужого импорта) и уже загруженного.
+
+Запуск из папки backend:
+    python -m bench.stats [years]
+"""
+
+import os
+import sys
+import tempfile
+from datetime import date, timedelta
+
+import app
+from aggregate import fold_days
+from bench._util import timeit
+from bench.synthetic import segment_rows
+from segment_store import ColumnStore
+
+LEGACY_QUERY = """
+    SELECT 0, day, distance_m, duration_s, speed_kmh
+    FROM segments
+    WHERE activity_id = (SELECT id FROM activity_types WHERE name = 'cycling')
+"""
+
+
+def legacy_aggregates(cur, base_date):
+    """
+    Выборки старого get_stats: неделя, месяц, год и всё время отдельно.
+    """
+    week_start = base_date - timedelta(days=base_date.weekday())
+    month_start = base_date.replace(day=1)
+    ranges = [
+        (min(base_date - timedelta(days=1), week_start), week_start + timedelta(days=6)),
+        (month_start, month_start + timedelta(days=31)),
+        (date(base_date.year, 1, 1), date(base_date.year, 12, 31)),
+    ]
+    result = []
+    for start, end in ranges:
+        cur.execute(
+            LEGACY_QUERY + " AND day BETWEEN ? AND ?",
+            (app.day_number(start), app.day_number(end)),
+        )
+        result.append(buckets(cur.fetchall(), "day"))
+    cur.execute(LEGACY_QUERY)
+    result.append(buckets(cur.fetchall(), "year"))
+    return result
+
+
+def buckets(rows, granularity):
+    store = ColumnStore()
+    store.load(0, rows, {"cycling": 0})
+    daily = store.daily_range(store.first_day, store.last_day, "cycling")
+    return fold_days(store.first_day, daily, granularity)
+
+
+def columnar(conn, base_date, cold):
+    store = app.shards.default.store
+    with store.lock:
+        if cold:
+            store.invalidate()
+        store = app.load_column_store(conn, app.get_data_generation(conn))
+        return app.compute_stats_columnar(store, base_date)
+
+
+if __name__ == "__main__":
+    years = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    workdir = tempfile.mkdtemp()
+    app.configure_db(os.path.join(workdir, "travel.db"))
+    app.init_db()
+
+    rows = segment_rows(years=years)
+    conn = app.get_db()
+    app.write_segments(conn, rows)
+    cur = conn.cursor()
+    cur.row_factory = None
+
+    base_date = date(2025, 6, 15)
+    legacy_ms = timeit(lambda: legacy_aggregates(cur, base_date))
+    cold_ms = timeit(lambda: columnar(conn, base_date, cold=True))
+    warm_ms = timeit(lambda: columnar(conn, base_date, cold=False))
+
+    print("segments: %d" % len(rows))
+    print("four queries over segments: %8.2f ms" % legacy_ms)
+    print("store, load from segments:  %8.2f ms" % cold_ms)
+    print("store, already loaded:      %8.2f ms" % warm_ms)
+    app.release_db(conn)
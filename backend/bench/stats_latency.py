@@ -0,0 +1,53 @@
+# bench/stats_latency.py
+"""
+Задержка "тёплых" вызовов /stats: соединения из пула против
+sqlite3.connect на каждый запрос (пул без свободных соединений).
+
+Запуск из папки backend:
+    python -m bench.stats_latency [requests]
+"""
+
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import app
+from bench.synthetic import segment_rows
+
+
+def measure(client, n, bust_cache):
+    latencies = []
+    for i in range(n):
+        if bust_cache:
+            app.stats_cache.clear()
+        started = time.perf_counter()
+        response = client.get("/stats?date=2025-06-15")
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.99) - 1]
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+
+    workdir = tempfile.mkdtemp()
+    app.configure_db(os.path.join(workdir, "travel.db"))
+    app.init_db()
+    conn = app.get_db()
+    app.write_segments(conn, segment_rows(years=10))
+    app.release_db(conn)
+
+    client = app.app.test_client()
+    for bust_cache in (False, True):
+        for max_idle, title in ((4, "pool"), (0, "connect per request")):
+            app.shards.default.pool.max_idle = max_idle
+            app.shards.default.pool.close_all()
+            client.get("/stats?date=2025-06-15")
+            median, p99 = measure(client, n, bust_cache)
+            print(
+                "%-20s %-14s median %6.3f ms  p99 %6.3f ms"
+                % (title, "no cache" if bust_cache else "cached", median, p99)
+            )
@@ -0,0 +1,185 @@
+# bench/suite.py
+"""
+Набор замеров импорта и /stats на синтетических выгрузках разного
+размера, с результатом в JSON для сравнения между версиями.
+
+Для каждого размера (число событий в выгрузке):
+  event_to_row       — мкс на событие (разбор + классификация);
+  classify_activity  — мкс на вызов по уже разобранным событиям;
+  import             — потоковый импорт файла location-history.json
+                       целиком (чтение JSON, разбор, запись в SQLite)
+                       и его время по стадиям;
+  stats              — /stats: первый запрос (загрузка хранилища) и
+                       тёплые запросы со случайной датой мимо кэша.
+Микрозамеры идут по первым MICRO_SAMPLE событиям: время на событие от
+размера выгрузки не зависит.
+
+Всё локально: временные файлы и БД, сеть не нужна. 10M событий —
+несколько гигабайт JSON на диске и минуты импорта.
+
+Запуск из папки backend:
+    python -m bench.suite [--sizes 1k,10k,100k,1m] [--out results.json]
+Параметры выгрузки (--per-day, --mix, --near, --visits, --end, --seed) —
+как у python -m bench.synthetic.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+from itertools import islice
+
+import numpy as np
+
+import app
+from bench.synthetic import (
+    add_generator_args, format_mix, generator_kwargs, iter_timeline_events,
+    write_timeline,
+)
+
+SIZES = "1k,10k,100k,1m"
+MICRO_SAMPLE = 100_000
+STATS_REQUESTS = 200
+SUFFIXES = {"k": 1_000, "m": 1_000_000}
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    if text[-1:] in SUFFIXES:
+        return int(float(text[:-1]) * SUFFIXES[text[-1]])
+    return int(text)
+
+
+def events_for(n, args):
+    years = -(-n // (args.per_day * 365)) or 1
+    return islice(iter_timeline_events(years=years, **generator_kwargs(args)), n)
+
+
+def per_call_us(fn, items):
+    started = time.perf_counter()
+    for item in items:
+        fn(item)
+    return (time.perf_counter() - started) / len(items) * 1e6
+
+
+def micro(events):
+    parsed = [p for p in map(app.parse_event, events) if p is not None]
+    return {
+        "sample_events": len(events),
+        "event_to_row_us": round(per_call_us(app.event_to_row, events), 3),
+        "classify_activity_us": round(per_call_us(
+            lambda p: app.classify_activity(p[3], p[6], p[7], p[8], p[9], p[10]),
+            parsed,
+        ), 3),
+    }
+
+
+def stats_timings(client, end_year):
+    """
+    Первый /stats после импорта и тёплые запросы (кэш ответов выключен).
+    """
+    started = time.perf_counter()
+    client.get("/stats?date=%d-06-15" % end_year)
+    cold_ms = (time.perf_counter() - started) * 1000
+
+    rnd = random.Random(1)
+    latencies = []
+    for _ in range(STATS_REQUESTS):
+        base = date(end_year, 12, 31) - timedelta(days=rnd.randint(0, 3 * 365))
+        started = time.perf_counter()
+        response = client.get("/stats?date=" + base.isoformat())
+        latencies.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200
+    latencies.sort()
+    return {
+        "cold_ms": round(cold_ms, 3),
+        "warm_median_ms": round(statistics.median(latencies), 3),
+        "warm_p99_ms": round(latencies[int(len(latencies) * 0.99) - 1], 3),
+    }
+
+
+def run_size(n, args):
+    workdir = tempfile.mkdtemp()
+    try:
+        path = os.path.join(workdir, "location-history.json")
+        write_timeline(path, events_for(n, args))
+        result = {"events": n, "file_mb": round(os.path.getsize(path) / 2**20, 1)}
+        result.update(micro(list(islice(events_for(n, args), MICRO_SAMPLE))))
+
+        app.configure_db(os.path.join(workdir, "travel.db"), os.path.join(workdir, "users"))
+        app.init_db()
+        imported = app.import_history_file(path)
+        result["import"] = {
+            key: imported[key]
+            for key in ("elapsed_s", "events_per_s", "peak_rss_kb", "timings_s")
+        }
+        result["segments"] = imported["imported"]
+        result["stats"] = stats_timings(app.app.test_client(), args.end.year)
+        app.shards.close_all()
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Замеры импорта и /stats")
+    parser.add_argument("--sizes", default=SIZES,
+                        help="размеры выгрузки через запятую: 1k,10k,...,10m")
+    add_generator_args(parser, per_day=8)
+    parser.add_argument("--out", help="файл для JSON (по умолчанию stdout)")
+    args = parser.parse_args()
+
+    # Кэш ответов выключен: меряем сам расчёт
+    app.stats_cache.max_entries = 0
+    report = {
+        "environment": environment(),
+        "params": {
+            "per_day": args.per_day, "mix": format_mix(args.mix), "near": args.near,
+            "visits": args.visits, "end": args.end.isoformat(), "seed": args.seed,
+        },
+        "results": [],
+    }
+    for n in map(parse_size, args.sizes.split(",")):
+        result = run_size(n, args)
+        report["results"].append(result)
+        print(
+            "%9d events  event_to_row %6.2f us  classify %5.2f us  "
+            "import %8.0f ev/s  stats cold %8.2f ms  warm p99 %6.2f ms"
+            % (n, result["event_to_row_us"], result["classify_activity_us"],
+               result["import"]["events_per_s"], result["stats"]["cold_ms"],
+               result["stats"]["warm_p99_ms"]),
+            file=sys.stderr,
+        )
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
@@ -0,0 +1,253 @@
+# bench/synthetic.py
+"""
+Синтетические данные для бенчмарков.
+"""
+
+import argparse
+import json
+import math
+import random
+from datetime import date, datetime, time, timedelta, timezone
+from itertools import islice
+
+from app import day_number
+from constants import (
+    BIKE_PRIORITY_LOCATIONS, BIKE_RADIUS_M, SCOOTER_A, SCOOTER_B,
+    SCOOTER_PARKING, SCOOTER_RADIUS_M,
+)
+
+RAW_TYPES = ["walking", "cycling", "in passenger vehicle", "in bus", None]
+
+# Типы в сгенерированной выгрузке (None — без topCandidate) и их доли
+RAW_TYPE_MIX = [
+    ("walking", 0.3),
+    ("cycling", 0.3),
+    ("in passenger vehicle", 0.2),
+    ("in bus", 0.1),
+    (None, 0.1),
+]
+
+RAW_TYPE_SPEEDS_KMH = {
+    "walking": (3, 7),
+    "cycling": (8, 30),
+    "in passenger vehicle": (20, 90),
+    "in bus": (15, 50),
+    None: (2, 40),
+}
+
+# Особые точки, рядом с которыми классификация что-то меняет
+NEAR_POINTS = [
+    (p["lat"], p["lon"])
+    for p in BIKE_PRIORITY_LOCATIONS + [SCOOTER_A, SCOOTER_B, SCOOTER_PARKING]
+]
+
+METERS_PER_DEGREE = 111_320.0
+
+ACTIVITY_MIX = [
+    ("cycling", 0.4),
+    ("walking", 0.3),
+    ("in passenger vehicle", 0.2),
+    ("in bus", 0.1),
+]
+
+
+def segment_rows(years=10, per_day=4, end=None, seed=1):
+    """
+    Готовые строки таблицы segments за years лет до end:
+    (start_ts, end_ts, day, activity_type,
+     distance_m, duration_s, speed_kmh)
+    """
+    rnd = random.Random(seed)
+    tz = timezone(timedelta(hours=1))
+    end = end or datetime(2025, 12, 31, tzinfo=tz)
+    day = end - timedelta(days=365 * years)
+    types = [t for t, _ in ACTIVITY_MIX]
+    weights = [w for _, w in ACTIVITY_MIX]
+
+    rows = []
+    while day < end:
+        t = day.replace(hour=7)
+        for _ in range(per_day):
+            t += timedelta(minutes=rnd.randint(20, 180))
+            duration_s = rnd.uniform(120, 3600)
+            speed_kmh = rnd.uniform(2, 35)
+            distance_m = speed_kmh / 3.6 * duration_s
+            rows.append((
+                int(t.timestamp()),
+                int(t.timestamp() + duration_s),
+                day_number(t.date()),
+                rnd.choices(types, weights)[0],
+                distance_m,
+                duration_s,
+                speed_kmh,
+            ))
+        day += timedelta(days=1)
+    return rows
+
+
+def store_rows(rows):
+    """
+    Строки segment_rows -> строки ColumnStore.load и {тип: id}.
+    """
+    activities = {t: i for i, (t, _) in enumerate(ACTIVITY_MIX, start=1)}
+    return [
+        (activities[r[3]], r[2], r[4], r[5], r[6]) for r in rows
+    ], activities
+
+
+def timeline_events(n, per_day=4, seed=1, **kwargs):
+    """
+    Первые n событий iter_timeline_events (лет — сколько понадобится).
+    """
+    years = -(-n // (per_day * 365)) or 1
+    return list(islice(
+        iter_timeline_events(years=years, per_day=per_day, seed=seed, **kwargs), n
+    ))
+
+
+def iter_timeline_events(years=1, per_day=4, mix=RAW_TYPE_MIX, near=0.8,
+                         visits=0.05, end=None, seed=1):
+    """
+    События в формате location-history.json (Google Timeline) за years
+    лет до end, per_day перемещений в день, по одному, без списка
+    в памяти.
+
+    mix — [(тип из topCandidate или None, вес)], скорость — из
+    RAW_TYPE_SPEEDS_KMH (для других типов — как у None). near — доля
+    концов перемещений в радиусе особых точек (BIKE_PRIORITY_LOCATIONS,
+    точки самоката), остальные в 5–20 км от них. visits — доля событий
+    visit без перемещения.
+    """
+    rnd = random.Random(seed)
+    tz = timezone(timedelta(hours=1))
+    end = end or datetime(2025, 12, 31, tzinfo=tz)
+    day = end - timedelta(days=365 * years)
+    types = [t for t, _ in mix]
+    weights = [w for _, w in mix]
+
+    def geo():
+        lat, lon = rnd.choice(NEAR_POINTS)
+        if rnd.random() < near:
+            distance_m = rnd.uniform(0, 0.9 * min(BIKE_RADIUS_M, SCOOTER_RADIUS_M))
+        else:
+            distance_m = rnd.uniform(5_000, 20_000)
+        bearing = rnd.uniform(0, 2 * math.pi)
+        lat += distance_m * math.cos(bearing) / METERS_PER_DEGREE
+        lon += distance_m * math.sin(bearing) / (METERS_PER_DEGREE * math.cos(math.radians(lat)))
+        return "geo:%.7f,%.7f" % (lat, lon)
+
+    # Перемещения укладываются в 06:00–24:00
+    slot_s = 18 * 3600 // per_day
+    while day < end:
+        t = day.replace(hour=6, minute=0, second=0, microsecond=0)
+        for _ in range(per_day):
+            start = t + timedelta(seconds=rnd.randint(0, slot_s // 2))
+            duration_s = rnd.randint(60, slot_s // 2)
+            t += timedelta(seconds=slot_s)
+            event = {
+                "startTime": start.isoformat(timespec="milliseconds"),
+                "endTime": (start + timedelta(seconds=duration_s)).isoformat(timespec="milliseconds"),
+            }
+            if rnd.random() < visits:
+                event["visit"] = {}
+                yield event
+                continue
+            raw_type = rnd.choices(types, weights)[0]
+            speed_kmh = rnd.uniform(
+                *RAW_TYPE_SPEEDS_KMH.get(raw_type, RAW_TYPE_SPEEDS_KMH[None])
+            )
+            event["activity"] = {
+                "start": geo(),
+                "end": geo(),
+                "distanceMeters": "%.3f" % (speed_kmh / 3.6 * duration_s),
+            }
+            if raw_type:
+                event["activity"]["topCandidate"] = {"type": raw_type, "probability": "0.9"}
+            yield event
+        day += timedelta(days=1)
+
+
+def parse_mix(text):
+    """
+    "walking=0.3,cycling=0.5,none=0.2" -> mix для iter_timeline_events
+    (none — событие без topCandidate).
+    """
+    mix = []
+    for part in text.split(","):
+        name, sep, weight = part.rpartition("=")
+        name = name.strip()
+        try:
+            weight = float(weight)
+        except ValueError:
+            weight = -1.0
+        if not sep or not name or weight < 0:
+            raise argparse.ArgumentTypeError("expected type=weight, got %r" % part)
+        mix.append((None if name == "none" else name, weight))
+    if not sum(w for _, w in mix):
+        raise argparse.ArgumentTypeError("all weights are zero")
+    return mix
+
+
+def format_mix(mix):
+    return ",".join("%s=%g" % (t or "none", w) for t, w in mix)
+
+
+def add_generator_args(parser, per_day=4):
+    """
+    Параметры генератора выгрузки в argparse (synthetic, suite).
+    """
+    parser.add_argument("--per-day", type=int, default=per_day,
+                        help="перемещений в день")
+    parser.add_argument("--mix", type=parse_mix, default=RAW_TYPE_MIX,
+                        help="типы и их веса, по умолчанию %s" % format_mix(RAW_TYPE_MIX))
+    parser.add_argument("--near", type=float, default=0.8,
+                        help="доля точек рядом с особыми локациями")
+    parser.add_argument("--visits", type=float, default=0.05,
+                        help="доля событий visit без перемещения")
+    parser.add_argument("--end", type=date.fromisoformat, default=date(2025, 12, 31),
+                        help="день, до которого (не включая) идёт выгрузка, YYYY-MM-DD")
+    parser.add_argument("--seed", type=int, default=1)
+
+
+def generator_kwargs(args):
+    """
+    Разобранные add_generator_args -> аргументы iter_timeline_events.
+    """
+    return {
+        "per_day": args.per_day,
+        "mix": args.mix,
+        "near": args.near,
+        "visits": args.visits,
+        "end": datetime.combine(args.end, time(), timezone(timedelta(hours=1))),
+        "seed": args.seed,
+    }
+
+
+def write_timeline(path, events):
+    """
+    Пишет события массивом JSON, по одному (файл может быть в гигабайты).
+    Возвращает число событий.
+    """
+    n = 0
+    with open(path, "w") as f:
+        f.write("[")
+        for event in events:
+            f.write(",\n" if n else "\n")
+            json.dump(event, f)
+            n += 1
+        f.write("\n]\n")
+    return n
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Синтетическая выгрузка location-history.json"
+    )
+    parser.add_argument("path")
+    parser.add_argument("--years", type=int, default=1)
+    add_generator_args(parser)
+    args = parser.parse_args()
+    n = write_timeline(args.path, iter_timeline_events(
+        years=args.years, **generator_kwargs(args)
+    ))
+    print("%d events -> %s" % (n, args.path))
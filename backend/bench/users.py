@@ -0,0 +1,132 @@
+# bench/users.py
+"""
+Нагрузочный тест /stats?user_id= при росте числа пользователей.
+
+У каждого пользователя одинаковый объём данных (свой файл БД, копия
+одного шаблона). Для 1, 10, 100, 1000 пользователей меряется:
+  cold — первый /stats пользователя (загрузка его хранилища из файла);
+  warm — несколько потоков бьют в случайных пользователей со случайной
+         датой (мимо кэша ответов), медиана и p95.
+Для сравнения — те же данные всех пользователей в одном общем файле:
+там загрузка хранилища растёт с числом пользователей.
+
+Запуск из папки backend:
+    python -m bench.users [segments_per_user]
+"""
+
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+import app
+from bench.synthetic import segment_rows
+
+USER_COUNTS = (1, 10, 100, 1000)
+THREADS = 4
+REQUESTS_PER_THREAD = 200
+
+# ?user_id= бэкенд принимает только от бота (app.bot_token_ok)
+BOT_TOKEN = "bench"
+HEADERS = {"X-Bot-Token": BOT_TOKEN}
+
+
+def write_rows(shard, rows):
+    conn = shard.pool.acquire()
+    try:
+        for i in range(0, len(rows), app.IMPORT_BATCH_SIZE):
+            app.write_segments(conn, rows[i:i + app.IMPORT_BATCH_SIZE], shard=shard)
+    finally:
+        shard.pool.release(conn)
+
+
+def random_date(rnd):
+    return (date(2024, 1, 1) + timedelta(days=rnd.randint(0, 730))).isoformat()
+
+
+def cold_ms(client, url):
+    started = time.perf_counter()
+    client.get(url, headers=HEADERS)
+    return (time.perf_counter() - started) * 1000
+
+
+def warm_latencies(users):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker(seed):
+        rnd = random.Random(seed)
+        client = app.app.test_client()
+        local = []
+        for _ in range(REQUESTS_PER_THREAD):
+            url = "/stats?user_id=%d&date=%s" % (rnd.choice(users), random_date(rnd))
+            started = time.perf_counter()
+            client.get(url, headers=HEADERS)
+            local.append((time.perf_counter() - started) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    latencies.sort()
+    return statistics.median(latencies), latencies[int(len(latencies) * 0.95) - 1]
+
+
+if __name__ == "__main__":
+    per_user = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    rows = segment_rows(years=2, per_day=max(1, per_user // 730))
+    workdir = tempfile.mkdtemp()
+    users_dir = os.path.join(workdir, "users")
+    app.BOT_TOKEN = BOT_TOKEN
+    # Кэш ответов выключен: меряем сам расчёт
+    app.stats_cache.max_entries = 0
+
+    # Шаблон: файл одного пользователя, остальные — его копии
+    app.configure_db(os.path.join(workdir, "travel.db"), users_dir)
+    app.init_db()
+    write_rows(app.shards.get(1, create=True), rows)
+    app.shards.close_all()
+    template = app.shards.path(1)
+
+    print("segments per user: %d" % len(rows))
+    for n in USER_COUNTS:
+        for user_id in range(2, n + 1):
+            path = os.path.join(users_dir, "%d.db" % user_id)
+            if not os.path.exists(path):
+                shutil.copyfile(template, path)
+
+        # Новый роутер — хранилища пусты, все файлы открыты
+        app.configure_db(os.path.join(workdir, "travel.db"), users_dir)
+        app.shards.max_open = n
+        client = app.app.test_client()
+        users = list(range(1, n + 1))
+        sample = random.Random(n).sample(users, min(n, 50))
+        cold = statistics.median(
+            cold_ms(client, "/stats?user_id=%d&date=2025-06-15" % u) for u in sample
+        )
+        for u in users:
+            client.get("/stats?user_id=%d&date=2025-06-15" % u, headers=HEADERS)
+        median, p95 = warm_latencies(users)
+        print("users %5d  per-user files: cold %7.2f ms   warm median %6.2f ms  p95 %6.2f ms"
+              % (n, cold, median, p95))
+
+    # Все пользователи в одном файле (start_ts сдвинут, чтобы не совпал ключ)
+    for n in USER_COUNTS[:3]:
+        shared = os.path.join(workdir, "shared-%d.db" % n)
+        app.configure_db(shared, users_dir)
+        app.init_db()
+        write_rows(app.shards.default, [
+            (r[0] + u, r[1] + u) + r[2:] for u in range(n) for r in rows
+        ])
+        app.shards.default.store.invalidate()
+        client = app.app.test_client()
+        print("users %5d  one shared file:  cold %7.2f ms   (%d segments)"
+              % (n, cold_ms(client, "/stats?date=2025-06-15"), n * len(rows)))
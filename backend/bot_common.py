@@ -0,0 +1,39 @@
+# bot_common.py
+"""
+Общее для синхронного (start_bot.py) и асинхронного
+(start_bot_async.py) ботов.
+"""
+
+import os
+
+from dotenv import load_dotenv
+
+
+load_dotenv()
+API_TOKEN = os.getenv("API_TOKEN")
+BACKEND_URL = os.getenv("BACKEND_URL", "http://127.0.0.1:5000")
+WEB_APP_URL = "https://acea3d9fe53b.ngrok-free.app"  # ссылка на ваш Web App
+
+# С этим заголовком бэкенд принимает от ботов ?user_id= (app.bot_token_ok)
+BOT_AUTH_HEADERS = {"X-Bot-Token": API_TOKEN or ""}
+
+# Как часто и сколько всего ждём фоновый импорт
+IMPORT_POLL_INTERVAL_S = 2
+IMPORT_POLL_TIMEOUT_S = 30 * 60
+
+
+def import_result_text(job):
+    """
+    Итог задачи /import/<job_id> -> сообщение пользователю.
+    None — не дождались окончания.
+    """
+    if job is None:
+        return "Импорт всё ещё идёт, результат пока неизвестен."
+    if job["state"] == "failed":
+        return f"Не удалось импортировать файл: {job['error']}"
+    return (
+        "Импорт завершён!\n"
+        f"Событий: {job['processed']}\n"
+        f"Добавлено: {job['imported']}\n"
+        f"Уже было: {job['skipped_duplicates']}"
+    )
@@ -0,0 +1,191 @@
+# classify_batch.py
+"""
+Векторная (NumPy) классификация целой пачки сегментов.
+
+Повторяет правила classify_activity из app.py, но считает расстояния
+до всех особых точек сразу матрицами (с отсевом по рамкам). Скалярная classify_activity
+остаётся эталоном — результаты должны совпадать.
+"""
+
+import numpy as np
+
+from constants import (
+    BIKE_RADIUS_M,
+    SCOOTER_RADIUS_M,
+    BUS_RADIUS_M,
+    BIKE_SPEED_MIN_KMH,
+    BIKE_SPEED_MAX_KMH,
+    BIKE_PRIORITY_LOCATIONS,
+    SCOOTER_A,
+    SCOOTER_B,
+    SCOOTER_PARKING,
+    BUS_STOPS,
+)
+from geo import BOX_MARGIN, EARTH_RADIUS_M, GEO_COUNTERS, BUS_STOPS_INDEX
+
+# Ограничение на размер матрицы расстояний (ячеек) за один проход
+MAX_MATRIX_CELLS = 2_000_000
+
+# С какого числа целей матрицу N x M заменяем запросами к LocationIndex
+INDEX_MIN_POINTS = 64
+
+
+def _points(locations):
+    lat = np.array([loc["lat"] for loc in locations], dtype=float)
+    lon = np.array([loc["lon"] for loc in locations], dtype=float)
+    return lat, lon
+
+
+SCOOTER_POINTS = _points([SCOOTER_A, SCOOTER_B, SCOOTER_PARKING])
+BIKE_POINTS = _points(BIKE_PRIORITY_LOCATIONS)
+BUS_POINTS = _points(BUS_STOPS)
+
+
+def haversine_pairs(lat1, lon1, lat2, lon2):
+    """
+    Поэлементный haversine для массивов одинаковой формы, в метрах.
+    """
+    phi1 = np.radians(lat1)
+    phi2 = np.radians(lat2)
+    dphi = np.radians(lat2 - lat1)
+    dlambda = np.radians(lon2 - lon1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(
+        dlambda / 2
+    ) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_M * c
+
+
+def near_matrix(lat, lon, points, radius_m):
+    """
+    (N, M) bool: точка i в радиусе от цели j.
+
+    Сначала дешёвый отсев по рамке вокруг каждой цели (как geo.near_box),
+    haversine считается только для пар внутри рамки.
+    """
+    points_lat, points_lon = points
+    dlat = np.degrees(radius_m / EARTH_RADIUS_M) * BOX_MARGIN
+    max_abs_lat = np.minimum(np.abs(points_lat) + dlat, 89.0)
+    dlon = dlat / np.cos(np.radians(max_abs_lat))
+
+    candidates = (
+        (np.abs(lat[:, None] - points_lat[None, :]) <= dlat)
+        & (np.abs(lon[:, None] - points_lon[None, :]) <= dlon[None, :])
+    )
+    n_candidates = int(np.count_nonzero(candidates))
+    GEO_COUNTERS["haversine"] += n_candidates
+    GEO_COUNTERS["avoided"] += candidates.size - n_candidates
+
+    result = np.zeros(candidates.shape, dtype=bool)
+    if n_candidates:
+        i, j = np.nonzero(candidates)
+        dist = haversine_pairs(lat[i], lon[i], points_lat[j], points_lon[j])
+        result[i, j] = dist <= radius_m
+    return result
+
+
+def near_any(lat, lon, points, radius_m):
+    """
+    (N,) bool: точка рядом хоть с одной целью.
+    Большие списки целей (остановки) считаются блоками по строкам.
+    """
+    points_lat, _ = points
+    n = len(lat)
+    result = np.zeros(n, dtype=bool)
+    if n == 0 or len(points_lat) == 0:
+        return result
+
+    step = max(1, MAX_MATRIX_CELLS // len(points_lat))
+    for i in range(0, n, step):
+        block = near_matrix(lat[i:i + step], lon[i:i + step], points, radius_m)
+        result[i:i + step] = block.any(axis=1)
+    return result
+
+
+def near_any_indexed(lat, lon, index, mask=None):
+    """
+    (N,) bool через LocationIndex: стоимость не зависит от числа целей.
+    mask — проверять только отмеченные точки.
+    """
+    result = np.zeros(len(lat), dtype=bool)
+    valid = ~(np.isnan(lat) | np.isnan(lon))
+    if mask is not None:
+        valid &= mask
+    for i in np.flatnonzero(valid):
+        result[i] = index.near_any(float(lat[i]), float(lon[i]))
+    return result
+
+
+def is_scooter_batch(start_lat, start_lon, end_lat, end_lon):
+    """
+    Векторный is_scooter_segment.
+    """
+    s = near_matrix(start_lat, start_lon, SCOOTER_POINTS, SCOOTER_RADIUS_M)
+    e = near_matrix(end_lat, end_lon, SCOOTER_POINTS, SCOOTER_RADIUS_M)
+    s_a, s_b, s_p = s[:, 0], s[:, 1], s[:, 2]
+    e_a, e_b, e_p = e[:, 0], e[:, 1], e[:, 2]
+
+    return (
+        (s_a & e_b)                 # A -> B
+        | (s_b & e_a)               # B -> A
+        | (s_p & (e_a | e_b))       # парковка -> A/B
+        | (e_p & (s_a | s_b))       # A/B -> парковка
+        | (s_p & e_p)               # парковка -> парковка
+    )
+
+
+def is_bus_batch(start_lat, start_lon, end_lat, end_lon):
+    """
+    Векторный is_bus_segment.
+    """
+    if not BUS_STOPS:
+        return np.zeros(len(start_lat), dtype=bool)
+
+    if len(BUS_STOPS_INDEX) >= INDEX_MIN_POINTS:
+        start_near = near_any_indexed(start_lat, start_lon, BUS_STOPS_INDEX)
+        return near_any_indexed(end_lat, end_lon, BUS_STOPS_INDEX, mask=start_near)
+
+    start_near = near_any(start_lat, start_lon, BUS_POINTS, BUS_RADIUS_M)
+    end_near = near_any(end_lat, end_lon, BUS_POINTS, BUS_RADIUS_M)
+    return start_near & end_near
+
+
+def classify_activity_batch(raw_types, speeds, start_lat, start_lon, end_lat, end_lon):
+    """
+    Пакетная версия classify_activity.
+
+    raw_types — список исходных типов (может содержать None),
+    остальное — массивы одинаковой длины, отсутствующие координаты = NaN.
+    Возвращает список меток в том же порядке.
+    """
+    speeds = np.asarray(speeds, dtype=float)
+    start_lat = np.asarray(start_lat, dtype=float)
+    start_lon = np.asarray(start_lon, dtype=float)
+    end_lat = np.asarray(end_lat, dtype=float)
+    end_lon = np.asarray(end_lon, dtype=float)
+
+    labels = [t or "unknown" for t in raw_types]
+    if not labels:
+        return labels
+
+    valid = ~(
+        np.isnan(start_lat) | np.isnan(start_lon)
+        | np.isnan(end_lat) | np.isnan(end_lon)
+    )
+
+    scooter = valid & is_scooter_batch(start_lat, start_lon, end_lat, end_lon)
+    bus = valid & ~scooter & is_bus_batch(start_lat, start_lon, end_lat, end_lon)
+
+    bike_speed = (speeds >= BIKE_SPEED_MIN_KMH) & (speeds <= BIKE_SPEED_MAX_KMH)
+    bike = valid & ~scooter & ~bus & bike_speed & (
+        near_any(start_lat, start_lon, BIKE_POINTS, BIKE_RADIUS_M)
+        | near_any(end_lat, end_lon, BIKE_POINTS, BIKE_RADIUS_M)
+    )
+
+    for i in np.flatnonzero(scooter):
+        labels[i] = "e-scooter"
+    for i in np.flatnonzero(bus):
+        labels[i] = "in bus"
+    for i in np.flatnonzero(bike):
+        labels[i] = "cycling"
+    return labels
@@ -16,6 +16,13 @@ BUS_RADIUS_M = 100.0
 BIKE_SPEED_MIN_KMH = 7.0
 BIKE_SPEED_MAX_KMH = 25.0
 
+# Диапазон скоростей, по которым считаются средняя и максимальная
+# скорость в статистике (км/ч). Для типов, которых здесь нет,
+# учитываются все сегменты.
+ACTIVITY_SPEED_RANGES_KMH = {
+    "cycling": (BIKE_SPEED_MIN_KMH, BIKE_SPEED_MAX_KMH),
+}
+
 # ---- 1 группа: локации с приоритетом велосипеда ----
 # В этих точках считаем, что чаще всего приезжаешь/уезжаешь на велике
 
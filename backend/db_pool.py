@@ -0,0 +1,100 @@
+# db_pool.py
+"""
+Небольшой пул соединений SQLite.
+
+Открывать sqlite3.connect на каждый запрос дорого: заново разбирается
+схема и прогревается кэш страниц. Пул отдаёт уже открытые соединения,
+PRAGMA применяются один раз при создании соединения.
+"""
+
+import queue
+import sqlite3
+import threading
+
+DEFAULT_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-20000",        # ~20 МБ кэша страниц
+    "PRAGMA mmap_size=268435456",      # 256 МБ
+    "PRAGMA temp_store=MEMORY",
+)
+
+
+class ConnectionPool:
+    """
+    Хранит до max_idle свободных соединений. Если свободных нет,
+    открывает новое; лишние при возврате закрываются.
+    """
+
+    def __init__(self, path, max_idle=4, pragmas=DEFAULT_PRAGMAS):
+        self.path = path
+        self.max_idle = max_idle
+        self.pragmas = pragmas
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._all = set()
+
+    def _connect(self):
+        # Соединение может перейти в другой поток вместе с пулом
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        with self._lock:
+            self._all.add(conn)
+        return conn
+
+    def acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        if conn.in_transaction:
+            conn.rollback()
+        if self._idle.qsize() < self.max_idle:
+            self._idle.put(conn)
+            return
+        self._discard(conn)
+
+    def _discard(self, conn):
+        with self._lock:
+            self._all.discard(conn)
+        conn.close()
+
+    def close_idle(self):
+        """
+        Закрывает свободные соединения; выданные вернутся как обычно.
+        """
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+    def close(self):
+        """
+        Пул больше не нужен: свободные соединения закрываются сразу,
+        выданные — когда их вернут.
+        """
+        self.max_idle = 0
+        self.close_idle()
+
+    def close_all(self):
+        """
+        Закрывает все соединения пула (при остановке приложения).
+        """
+        while True:
+            try:
+                self._idle.get_nowait()
+            except queue.Empty:
+                break
+        with self._lock:
+            conns, self._all = self._all, set()
+        for conn in conns:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
@@ -0,0 +1,195 @@
+# dedup.py
+"""
+Отсев уже импортированного до разбора событий.
+
+Каждая выгрузка Timeline содержит всю историю заново, поэтому при
+повторном импорте почти все события уже лежат в БД. Чтобы не гонять их
+через parse_event, классификацию и INSERT OR IGNORE, храним:
+
+- event_hashes — 64-битные хэши сырых полей уже импортированных событий;
+- meta.events_watermark — начало самого позднего из них (секунды epoch,
+  с округлением вверх): события позже него заведомо новые, и в
+  event_hashes их не ищем;
+- imported_files — sha256 файлов, импортированных целиком: такой файл
+  повторно даже не открывается.
+"""
+
+import hashlib
+import math
+from datetime import datetime, timezone
+
+# Сколько хэшей проверяем одним SELECT ... IN (...)
+LOOKUP_CHUNK = 500
+
+FILE_HASH_CHUNK = 1024 * 1024
+
+
+def event_hash(ev):
+    """
+    Хэш полей, из которых строится сегмент. None — событие без activity
+    (посещение и т.п.): такие parse_event и так отбрасывает сразу.
+    """
+    act = ev.get("activity")
+    if not isinstance(act, dict) or "distanceMeters" not in act:
+        return None
+
+    top = act.get("topCandidate")
+    raw_type = top.get("type") if isinstance(top, dict) else None
+    key = "%s|%s|%s|%s|%s|%s" % (
+        ev.get("startTime"),
+        ev.get("endTime"),
+        act["distanceMeters"],
+        raw_type,
+        act.get("start"),
+        act.get("end"),
+    )
+    digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+    # Знаковое: ложится в INTEGER PRIMARY KEY SQLite
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def event_start_ts(ev):
+    try:
+        dt = datetime.fromisoformat(ev["startTime"])
+    except Exception:
+        return None
+    # Без смещения — UTC, как в parse_iso
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def load_watermark(conn):
+    row = conn.execute(
+        "SELECT value FROM meta WHERE key = 'events_watermark'"
+    ).fetchone()
+    return row[0] if row else 0
+
+
+def _seen_hashes(conn, hashes):
+    seen = set()
+    for i in range(0, len(hashes), LOOKUP_CHUNK):
+        part = hashes[i:i + LOOKUP_CHUNK]
+        cur = conn.execute(
+            "SELECT hash FROM event_hashes WHERE hash IN (%s)"
+            % ",".join("?" * len(part)),
+            part,
+        )
+        seen.update(r[0] for r in cur)
+    return seen
+
+
+def split_seen(conn, events, watermark):
+    """
+    Пачка событий -> (новые события, их хэши, макс. начало среди новых,
+    сколько отсеяно как уже виденные).
+    В event_hashes ищем только события не позже watermark.
+    """
+    hashed = []
+    to_check = []
+    for ev in events:
+        h = event_hash(ev)
+        if h is None:
+            hashed.append((ev, None, None))
+            continue
+        ts = event_start_ts(ev)
+        hashed.append((ev, h, ts))
+        if ts is None or ts <= watermark:
+            to_check.append(h)
+
+    seen = _seen_hashes(conn, to_check) if to_check else set()
+
+    fresh = []
+    hashes = []
+    max_ts = None
+    for ev, h, ts in hashed:
+        if h is not None:
+            if h in seen:
+                continue
+            hashes.append(h)
+            if ts is not None and (max_ts is None or ts > max_ts):
+                max_ts = ts
+        fresh.append(ev)
+
+    return fresh, hashes, max_ts, len(events) - len(fresh)
+
+
+def record_events(conn, hashes, max_ts):
+    """
+    Запоминает хэши событий и сдвигает watermark.
+    Коммит — за вызывающим (в той же транзакции, что и сами сегменты).
+    """
+    if hashes:
+        conn.executemany(
+            "INSERT OR IGNORE INTO event_hashes (hash) VALUES (?)",
+            ((h,) for h in hashes),
+        )
+    if max_ts is not None:
+        conn.execute(
+            """
+            UPDATE meta SET value = MAX(value, ?)
+            WHERE key = 'events_watermark'
+            """,
+            (math.ceil(max_ts),),
+        )
+
+
+# ---------- Файлы целиком ----------
+
+class HashingReader:
+    """
+    Обёртка над потоком: считает sha256 всего, что через неё прочитали.
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.fp.read(size)
+        self.sha256.update(data)
+        return data
+
+    def hexdigest(self):
+        """
+        Дочитывает поток до конца (разбор мог остановиться раньше)
+        и возвращает sha256 всего содержимого.
+        """
+        while self.read(FILE_HASH_CHUNK):
+            pass
+        return self.sha256.hexdigest()
+
+
+def file_sha256(path):
+    with open(path, "rb") as f:
+        return HashingReader(f).hexdigest()
+
+
+def find_imported_file(conn, digest):
+    """
+    Итог для повторной загрузки уже импортированного файла
+    (None — такого файла ещё не было).
+    """
+    row = conn.execute(
+        "SELECT events, rows FROM imported_files WHERE sha256 = ?", (digest,)
+    ).fetchone()
+    if row is None:
+        return None
+    return {
+        "imported": 0,
+        "skipped_duplicates": row[1],
+        "events": row[0],
+        "file_already_imported": True,
+    }
+
+
+def record_imported_file(conn, digest, result):
+    conn.execute(
+        """
+        INSERT OR REPLACE INTO imported_files (sha256, imported_at, events, rows)
+        VALUES (?, strftime('%s', 'now'), ?, ?)
+        """,
+        (digest, result["events"],
+         result["imported"] + result["skipped_duplicates"]),
+    )
+    conn.commit()
@@ -0,0 +1,194 @@
+# geo.py
+"""
+Расстояния и поиск особых точек рядом с координатой.
+"""
+
+import math
+
+from constants import (
+    BIKE_RADIUS_M,
+    SCOOTER_RADIUS_M,
+    BUS_RADIUS_M,
+    BIKE_PRIORITY_LOCATIONS,
+    SCOOTER_A,
+    SCOOTER_B,
+    SCOOTER_PARKING,
+    BUS_STOPS,
+)
+
+EARTH_RADIUS_M = 6371000.0
+
+# Запас рамки вокруг точки и допуск равнопромежуточного приближения
+BOX_MARGIN = 1.01
+EQUIRECT_TOLERANCE = 1e-3
+
+# Сколько раз считали haversine в is_near и сколько раз обошлись без него.
+# Общие на процесс; /import берёт разницу до и после.
+GEO_COUNTERS = {"haversine": 0, "avoided": 0}
+
+# (lat, lon, radius_m) -> рамка, см. near_box
+_NEAR_BOXES = {}
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """
+    Расстояние между двумя точками (lat, lon) в метрах.
+    """
+    if None in (lat1, lon1, lat2, lon2):
+        return None
+    R = EARTH_RADIUS_M
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(
+        dlambda / 2
+    ) ** 2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    return R * c
+
+
+def near_box(target_lat, target_lon, radius_m):
+    """
+    Заранее посчитанная рамка вокруг точки для быстрого отсева:
+    (lat_min, lat_max, lon_min, lon_max, cos_lat, inner2, outer2).
+
+    Всё, что вне рамки по lat/lon, заведомо дальше radius_m.
+    inner2 / outer2 — квадраты порогов для равнопромежуточного
+    приближения (в радианах), между ними решает haversine.
+    """
+    key = (target_lat, target_lon, radius_m)
+    box = _NEAR_BOXES.get(key)
+    if box is not None:
+        return box
+
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M) * BOX_MARGIN
+    max_abs_lat = min(abs(target_lat) + dlat, 89.0)
+    dlon = dlat / math.cos(math.radians(max_abs_lat))
+
+    radius_rad = radius_m / EARTH_RADIUS_M
+    box = (
+        target_lat - dlat,
+        target_lat + dlat,
+        target_lon - dlon,
+        target_lon + dlon,
+        math.cos(math.radians(target_lat)),
+        (radius_rad * (1 - EQUIRECT_TOLERANCE)) ** 2,
+        (radius_rad * (1 + EQUIRECT_TOLERANCE)) ** 2,
+    )
+    _NEAR_BOXES[key] = box
+    return box
+
+
+def is_near(lat, lon, target_lat, target_lon, radius_m):
+    if lat is None or lon is None:
+        return False
+
+    lat_min, lat_max, lon_min, lon_max, cos_lat, inner2, outer2 = near_box(
+        target_lat, target_lon, radius_m
+    )
+    if not (lat_min <= lat <= lat_max and lon_min <= lon <= lon_max):
+        GEO_COUNTERS["avoided"] += 1
+        return False
+
+    # На расстояниях порядка радиуса плоское приближение точнее допуска
+    x = math.radians(lon - target_lon) * cos_lat
+    y = math.radians(lat - target_lat)
+    d2 = x * x + y * y
+    if d2 <= inner2:
+        GEO_COUNTERS["avoided"] += 1
+        return True
+    if d2 >= outer2:
+        GEO_COUNTERS["avoided"] += 1
+        return False
+
+    GEO_COUNTERS["haversine"] += 1
+    dist = haversine_m(lat, lon, target_lat, target_lon)
+    return dist <= radius_m
+
+
+def is_near_any(lat, lon, locations, radius_m):
+    """
+    Линейный перебор — эталон для LocationIndex.
+    """
+    for loc in locations:
+        if is_near(lat, lon, loc["lat"], loc["lon"], radius_m):
+            return True
+    return False
+
+
+class LocationIndex:
+    """
+    Сетка по lat/lon для поиска точек в фиксированном радиусе.
+
+    Ячейка не меньше радиуса (с запасом), поэтому всё, что ближе radius_m,
+    лежит в той же или в одной из 8 соседних ячеек. Точное расстояние
+    (haversine) считается только для точек из этих 9 ячеек.
+    """
+
+    # Запас на неточность перевода метров в градусы
+    CELL_MARGIN = 1.05
+
+    def __init__(self, locations, radius_m):
+        self.radius_m = radius_m
+        self.size = len(locations)
+
+        self.cell_lat = math.degrees(radius_m / EARTH_RADIUS_M) * self.CELL_MARGIN
+        max_abs_lat = max((abs(loc["lat"]) for loc in locations), default=0.0)
+        max_abs_lat = min(max_abs_lat + self.cell_lat, 89.0)
+        self.cell_lon = self.cell_lat / math.cos(math.radians(max_abs_lat))
+
+        self.cells = {}
+        for loc in locations:
+            key = self._cell(loc["lat"], loc["lon"])
+            self.cells.setdefault(key, []).append(loc)
+            near_box(loc["lat"], loc["lon"], radius_m)
+
+    def __len__(self):
+        return self.size
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_lat), math.floor(lon / self.cell_lon)
+
+    def candidates(self, lat, lon):
+        """
+        Точки из 3x3 ячеек вокруг (lat, lon).
+        """
+        i, j = self._cell(lat, lon)
+        cells = self.cells
+        for di in (-1, 0, 1):
+            for dj in (-1, 0, 1):
+                bucket = cells.get((i + di, j + dj))
+                if bucket:
+                    yield from bucket
+
+    def query(self, lat, lon):
+        """
+        Все точки в радиусе radius_m.
+        """
+        if lat is None or lon is None:
+            return []
+        return [
+            loc for loc in self.candidates(lat, lon)
+            if is_near(lat, lon, loc["lat"], loc["lon"], self.radius_m)
+        ]
+
+    def near_any(self, lat, lon):
+        if lat is None or lon is None or not self.cells:
+            return False
+        for loc in self.candidates(lat, lon):
+            if is_near(lat, lon, loc["lat"], loc["lon"], self.radius_m):
+                return True
+        return False
+
+
+def geo_counters_snapshot():
+    return dict(GEO_COUNTERS)
+
+
+# Строятся один раз при старте из constants.py
+for _loc in (SCOOTER_A, SCOOTER_B, SCOOTER_PARKING):
+    near_box(_loc["lat"], _loc["lon"], SCOOTER_RADIUS_M)
+
+BIKE_LOCATIONS_INDEX = LocationIndex(BIKE_PRIORITY_LOCATIONS, BIKE_RADIUS_M)
+BUS_STOPS_INDEX = LocationIndex(BUS_STOPS, BUS_RADIUS_M)
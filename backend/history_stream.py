@@ -0,0 +1,371 @@
+# history_stream.py
+"""
+Потоковый разбор location-history.json.
+
+Экспорт Google Timeline за несколько лет весит сотни мегабайт, поэтому
+массив событий читается по одному элементу, а не целиком через json.load.
+Сжатые загрузки (gzip, zip, zstd) распаковываются на лету, тоже потоком.
+"""
+
+import codecs
+import gzip
+import json
+import re
+import shutil
+import tempfile
+import zipfile
+
+# Обёртки, внутри которых лежит массив событий
+EVENT_ARRAY_KEYS = ("events", "timelineObjects")
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZIP_MAGIC = b"PK\x03\x04"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+# Файлы Google Takeout без событий: в архиве их даже не открываем
+# (Records.json — сырые точки, сотни мегабайт)
+ZIP_SKIPPED_MEMBERS = ("records.json", "settings.json", "timeline edits.json")
+
+_WHITESPACE = " \t\n\r"
+
+# Для поиска конца значения без разбора: скобки и кавычки снаружи строк,
+# кавычка или обратный слэш внутри, конец числа / true / false / null
+_STRUCTURE_RE = re.compile(r'[][{}"]')
+_STRING_END_RE = re.compile(r'["\\]')
+_SCALAR_END_RE = re.compile(r'[\s,\]}]')
+# Чем может продолжаться число
+_NUMBER_CHARS = frozenset(".eE+-0123456789")
+
+
+class _StreamReader:
+    """
+    Буфер поверх бинарного потока: читает кусками и декодирует UTF-8.
+    Уже разобранная часть буфера регулярно отбрасывается.
+    """
+
+    def __init__(self, fp, chunk_size):
+        self.fp = fp
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """
+        Дочитывает следующий кусок. False — поток закончился.
+        """
+        if self.eof:
+            return False
+        chunk = self.fp.read(self.chunk_size)
+        if isinstance(chunk, str):
+            text = chunk
+        else:
+            text = self.decoder.decode(chunk, final=not chunk)
+        if not chunk:
+            self.eof = True
+        if self.pos > self.chunk_size:
+            self.buf = self.buf[self.pos:]
+            self.pos = 0
+        self.buf += text
+        return bool(text) or not self.eof
+
+    def peek(self):
+        """
+        Первый непробельный символ (или "" в конце потока).
+        """
+        while True:
+            buf = self.buf
+            pos = self.pos
+            while pos < len(buf) and buf[pos] in _WHITESPACE:
+                pos += 1
+            self.pos = pos
+            if pos < len(buf):
+                return buf[pos]
+            if not self.fill():
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError("Expected %r at offset %d" % (char, self.pos))
+        self.pos += 1
+
+    def decode_value(self, decoder):
+        """
+        Разбирает одно JSON-значение, при необходимости дочитывая поток.
+        Обычно значение (событие) целиком в буфере и разбирается сразу;
+        иначе его конец сначала находит value_end, и разбор идёт один раз.
+        """
+        first = self.peek()
+        try:
+            value, end = decoder.raw_decode(self.buf, self.pos)
+        except json.JSONDecodeError:
+            end = None
+        # Число могло оборваться на конце буфера: "15000000000." разберётся
+        # как 15000000000, и за ним в буфере ничего или "."
+        cut = end is not None and not self.eof and first not in '[{"' and (
+            end == len(self.buf) or self.buf[end] in _NUMBER_CHARS
+        )
+        if end is None or cut:
+            self.value_end(keep=True)
+            value, end = decoder.raw_decode(self.buf, self.pos)
+        self.pos = end
+        return value
+
+    def skip_value(self):
+        """
+        Пропускает одно JSON-значение, не строя его: пройденная часть
+        буфера отбрасывается, память не растёт с размером значения.
+        """
+        self.pos = self.value_end(keep=False)
+
+    def value_end(self, keep):
+        """
+        Индекс в self.buf сразу за значением, которое начинается
+        с self.pos. Смотрит только скобки и строки и дочитывает поток,
+        не начиная заново после каждого куска.
+        keep=True — значение остаётся в буфере целиком (для разбора),
+        keep=False — уже пройденное можно выбросить (self.pos сдвигается).
+        Корректность внутри значения не проверяется.
+        """
+        first = self.peek()
+        if first == "":
+            raise ValueError("Unexpected end of JSON")
+        i = self.pos
+        depth = 0
+        in_string = False
+        if first == '"':
+            in_string, i = True, i + 1
+        elif first in "[{":
+            depth, i = 1, i + 1
+        else:
+            # Число, true, false, null
+            while True:
+                m = _SCALAR_END_RE.search(self.buf, i)
+                if m is not None:
+                    return m.start()
+                i = self._more(len(self.buf), keep)
+                if i is None:
+                    return len(self.buf)
+
+        while True:
+            buf = self.buf
+            if in_string:
+                m = _STRING_END_RE.search(buf, i)
+                if m is not None and m.group() == '"':
+                    in_string, i = False, m.end()
+                    if depth == 0:
+                        return i
+                    continue
+                if m is not None and m.end() < len(buf):
+                    # \x — экранированный символ пропускаем
+                    i = m.end() + 1
+                    continue
+                # Строка (или экранирование) обрывается на конце буфера
+                i = len(buf) if m is None else m.start()
+            else:
+                m = _STRUCTURE_RE.search(buf, i)
+                if m is not None:
+                    char, i = m.group(), m.end()
+                    if char == '"':
+                        in_string = True
+                    elif char in "[{":
+                        depth += 1
+                    else:
+                        depth -= 1
+                        if depth == 0:
+                            return i
+                    continue
+                i = len(buf)
+            i = self._more(i, keep)
+            if i is None:
+                raise ValueError("Unexpected end of JSON")
+
+    def _more(self, i, keep):
+        """
+        Дочитывает поток, сохраняя позицию сканирования i (после fill
+        буфер мог сдвинуться). None — поток закончился.
+        """
+        if keep:
+            offset = i - self.pos
+            if not self.fill():
+                return None
+            return self.pos + offset
+        self.pos = i
+        if not self.fill():
+            return None
+        return self.pos
+
+
+def _iter_array(reader, decoder):
+    reader.expect("[")
+    if reader.peek() == "]":
+        reader.pos += 1
+        return
+    while True:
+        yield reader.decode_value(decoder)
+        char = reader.peek()
+        reader.pos += 1
+        if char == "]":
+            return
+        if char != ",":
+            raise ValueError("Expected ',' or ']' in events array")
+
+
+def iter_events(fp, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Генератор событий из потока fp (файл, request.stream и т.п.).
+
+    Поддерживает и голый массив, и обёртку {"events": [...]} /
+    {"timelineObjects": [...]}. Некорректный JSON -> ValueError.
+    """
+    reader = _StreamReader(fp, chunk_size)
+    decoder = json.JSONDecoder()
+
+    # BOM в начале файла
+    if reader.peek() == "\ufeff":
+        reader.pos += 1
+
+    first = reader.peek()
+    if first == "[":
+        yield from _iter_array(reader, decoder)
+        return
+
+    if first != "{":
+        raise ValueError("Expected JSON array or known wrapper")
+
+    reader.expect("{")
+    if reader.peek() == "}":
+        raise ValueError("Expected JSON array or known wrapper")
+    while True:
+        key = reader.decode_value(decoder)
+        reader.expect(":")
+        if key in EVENT_ARRAY_KEYS and reader.peek() == "[":
+            yield from _iter_array(reader, decoder)
+            return
+        # Остальные ключи обёртки пропускаем, не разбирая
+        reader.skip_value()
+        char = reader.peek()
+        reader.pos += 1
+        if char != ",":
+            raise ValueError("Expected JSON array or known wrapper")
+
+
+class _PrefixedStream:
+    """
+    Поток, у которого уже прочитали первые байты (для определения формата):
+    отдаёт их обратно, затем читает дальше из fp.
+    """
+
+    def __init__(self, prefix, fp):
+        self.prefix = prefix
+        self.fp = fp
+
+    def read(self, size=-1):
+        if self.prefix:
+            if size is None or size < 0:
+                data, self.prefix = self.prefix + self.fp.read(), b""
+                return data
+            data, self.prefix = self.prefix[:size], self.prefix[size:]
+            if len(data) < size:
+                data += self.fp.read(size - len(data))
+            return data
+        return self.fp.read(size)
+
+
+def detect_compression(head):
+    if head.startswith(GZIP_MAGIC):
+        return "gzip"
+    if head.startswith(ZIP_MAGIC):
+        return "zip"
+    if head.startswith(ZSTD_MAGIC):
+        return "zstd"
+    return None
+
+
+def _iter_zip_events(fp, chunk_size):
+    """
+    Все .json внутри архива (Google Takeout) по очереди. Известные
+    файлы без событий (ZIP_SKIPPED_MEMBERS) пропускаются по имени,
+    остальные без массива событий — после разбора обёртки.
+    """
+    with zipfile.ZipFile(fp) as archive:
+        names = sorted(
+            n for n in archive.namelist()
+            if n.lower().endswith(".json")
+            and n.rsplit("/", 1)[-1].lower() not in ZIP_SKIPPED_MEMBERS
+        )
+        if not names:
+            raise ValueError("Zip archive contains no location history .json files")
+
+        for name in names:
+            with archive.open(name) as member:
+                events = iter_events(member, chunk_size)
+                try:
+                    first = next(events)
+                except StopIteration:
+                    continue
+                except ValueError:
+                    # не тот формат — это не location history
+                    continue
+                yield first
+                yield from events
+
+
+def iter_history_events(fp, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Как iter_events, но fp может быть сжат gzip / zip / zstd —
+    формат определяется по первым байтам, распаковка идёт потоком.
+    Для zip нужен seekable-поток; остальное при необходимости
+    сначала сбрасывается во временный файл.
+    """
+    head = fp.read(4)
+    compression = detect_compression(head)
+    stream = _PrefixedStream(head, fp)
+
+    if compression is None:
+        yield from iter_events(stream, chunk_size)
+
+    elif compression == "gzip":
+        try:
+            with gzip.GzipFile(fileobj=stream) as plain:
+                yield from iter_events(plain, chunk_size)
+        except (OSError, EOFError) as e:
+            raise ValueError("Invalid gzip data: %s" % e)
+
+    elif compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("zstd uploads require the zstandard package")
+        try:
+            reader = zstandard.ZstdDecompressor().stream_reader(stream)
+            with reader as plain:
+                yield from iter_events(plain, chunk_size)
+        except zstandard.ZstdError as e:
+            raise ValueError("Invalid zstd data: %s" % e)
+
+    else:
+        try:
+            seekable = fp.seekable()
+        except AttributeError:
+            seekable = False
+        try:
+            if seekable:
+                fp.seek(0)
+                yield from _iter_zip_events(fp, chunk_size)
+            else:
+                with tempfile.TemporaryFile() as spooled:
+                    spooled.write(head)
+                    shutil.copyfileobj(fp, spooled)
+                    spooled.seek(0)
+                    yield from _iter_zip_events(spooled, chunk_size)
+        except zipfile.BadZipFile as e:
+            raise ValueError("Invalid zip archive: %s" % e)
+
+
+def iter_events_from_file(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    with open(path, "rb") as fp:
+        yield from iter_history_events(fp, chunk_size)
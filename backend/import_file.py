@@ -0,0 +1,14 @@
+import json
+import sys
+
+from app import init_db, import_history_file
+
+
+# python import_file.py location-history.json
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("usage: python import_file.py <location-history.json>")
+        sys.exit(1)
+
+    init_db()
+    print(json.dumps(import_history_file(sys.argv[1]), indent=2))
@@ -0,0 +1,141 @@
+# metrics.py
+"""
+Счётчики и время по стадиям горячих путей (импорт, /stats).
+
+METRICS — общие для процесса суммы, их отдаёт /metrics в текстовом
+формате Prometheus. Timings — время стадий одного запроса или импорта:
+каждая стадия сразу добавляется и в METRICS, а по запросу уходит
+клиенту в заголовке Server-Timing.
+
+Под uvicorn с несколькими процессами у каждого процесса свои суммы:
+/metrics показывает процесс, который принял запрос (метка pid).
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+PREFIX = "travel_"
+
+COUNTERS = {
+    "import_events_total": "Событий прочитано из загрузок",
+    "import_rows_inserted_total": "Сегментов записано в SQLite",
+    "import_duplicates_total": "Событий и сегментов, отсеянных как уже импортированные",
+    "stats_cache_hits_total": "Ответов /stats из кэша",
+    "stats_cache_misses_total": "Ответов /stats, посчитанных заново",
+    "stats_not_modified_total": "Ответов /stats 304 по ETag",
+}
+
+STAGE_HELP = "Время по стадиям обработки, секунды"
+
+
+class Metrics:
+    """
+    Счётчики и суммы времени по (путь, стадия), потокобезопасно.
+    extra() — дополнительные счётчики, которые считаются в другом
+    месте (например, geo.GEO_COUNTERS): {имя: (описание, значение)}.
+    """
+
+    def __init__(self, extra=None):
+        self.extra = extra
+        self._counters = dict.fromkeys(COUNTERS, 0)
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, path, stage, seconds):
+        with self._lock:
+            total = self._stages.setdefault((path, stage), [0.0, 0])
+            total[0] += seconds
+            total[1] += 1
+
+    def render(self):
+        """
+        Текстовый формат Prometheus (exposition format 0.0.4).
+        """
+        pid = 'pid="%d"' % os.getpid()
+        with self._lock:
+            counters = dict(self._counters)
+            stages = {key: tuple(value) for key, value in self._stages.items()}
+        extra = self.extra() if self.extra is not None else {}
+
+        lines = []
+        for name, help_text in COUNTERS.items():
+            lines.append(_counter(name, help_text, pid, counters[name]))
+        for name, (help_text, value) in extra.items():
+            lines.append(_counter(name, help_text, pid, value))
+
+        name = PREFIX + "stage_seconds"
+        lines.append("# HELP %s %s\n# TYPE %s summary" % (name, STAGE_HELP, name))
+        for (path, stage), (seconds, count) in sorted(stages.items()):
+            labels = '%s,path="%s",stage="%s"' % (pid, path, stage)
+            lines.append("%s_sum{%s} %.6f" % (name, labels, seconds))
+            lines.append("%s_count{%s} %d" % (name, labels, count))
+        return "\n".join(lines) + "\n"
+
+
+def _counter(name, help_text, labels, value):
+    name = PREFIX + name
+    return "# HELP %s %s\n# TYPE %s counter\n%s{%s} %s" % (
+        name, help_text, name, name, labels, value
+    )
+
+
+METRICS = Metrics()
+
+
+class Timings:
+    """
+    Время стадий одной операции path ("import", "import_job", "stats").
+    Стадии могут повторяться (пачки импорта) и идти из разных потоков —
+    суммируются.
+    """
+
+    def __init__(self, path, metrics=METRICS):
+        self.path = path
+        self.metrics = metrics
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self.metrics.observe(self.path, name, seconds)
+
+    def merge(self, stages):
+        """
+        Стадии, посчитанные в другом процессе ({стадия: секунды}).
+        """
+        for name, seconds in stages.items():
+            self.add(name, seconds)
+
+    def server_timing(self):
+        """
+        Значение заголовка Server-Timing (длительности в мс).
+        """
+        with self._lock:
+            stages = list(self.stages.items())
+        return ", ".join("%s;dur=%.3f" % (name, s * 1000) for name, s in stages)
+
+    def as_dict(self):
+        with self._lock:
+            return {name: round(s, 6) for name, s in self.stages.items()}
+
+
+def stage(timings, name):
+    """
+    timings.stage(name); без timings (None) — ничего не меряет.
+    """
+    return timings.stage(name) if timings is not None else nullcontext()
@@ -0,0 +1,157 @@
+import os
+import sqlite3
+import statistics
+import sys
+import time
+from datetime import date
+
+import app
+from segment_store import ColumnStore
+
+# Суммы по дням прямо из segments одним GROUP BY
+LEGACY_DAILY_SQL = """
+    SELECT
+        start_date,
+        SUM(distance_m),
+        SUM(CASE WHEN speed_kmh BETWEEN :min AND :max THEN distance_m ELSE 0 END),
+        SUM(CASE WHEN speed_kmh BETWEEN :min AND :max THEN duration_s ELSE 0 END),
+        MAX(CASE WHEN speed_kmh BETWEEN :min AND :max THEN speed_kmh ELSE 0 END)
+    FROM segments
+    WHERE activity_type = 'cycling'
+    GROUP BY start_date
+"""
+
+COMPACT_DAILY_SQL = """
+    SELECT
+        day,
+        SUM(distance_m),
+        SUM(CASE WHEN speed_kmh BETWEEN :min AND :max THEN distance_m ELSE 0 END),
+        SUM(CASE WHEN speed_kmh BETWEEN :min AND :max THEN duration_s ELSE 0 END),
+        MAX(CASE WHEN speed_kmh BETWEEN :min AND :max THEN speed_kmh ELSE 0 END)
+    FROM segments
+    WHERE activity_id = (SELECT id FROM activity_types WHERE name = 'cycling')
+    GROUP BY day
+"""
+
+# Строки для ColumnStore из старой схемы: день из ISO-даты, тип текстом
+LEGACY_STORE_SQL = """
+    SELECT
+        activity_type,
+        CAST(julianday(start_date) - 2440587.5 AS INTEGER),
+        distance_m,
+        duration_s,
+        speed_kmh
+    FROM segments
+"""
+
+REPEAT = 20
+
+
+def db_size(path):
+    return sum(
+        os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p)
+    )
+
+
+def median_ms(fn):
+    fn()
+    timings = []
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def daily_from_segments_ms(conn, sql, to_date):
+    params = {"min": app.BIKE_SPEED_MIN_KMH, "max": app.BIKE_SPEED_MAX_KMH}
+    return median_ms(
+        lambda: [(to_date(r[0]),) + tuple(r[1:]) for r in conn.execute(sql, params)]
+    )
+
+
+def legacy_stats_ms(conn):
+    """
+    /stats без кэша на старой схеме: те же загрузка и ответ, но типы
+    приходят текстом и id им назначаются при чтении.
+    """
+    store = ColumnStore()
+
+    def run():
+        activities = {}
+        rows = [
+            (activities.setdefault(name, len(activities)),) + tuple(rest)
+            for name, *rest in conn.execute(LEGACY_STORE_SQL)
+        ]
+        store.load(0, rows, activities)
+        app.compute_stats_columnar(store, date.today())
+
+    return median_ms(run)
+
+
+def stats_ms(conn):
+    """
+    /stats без кэша: загрузка колоночного хранилища из segments
+    и ответ по нему.
+    """
+    store = app.shards.default.store
+
+    def run():
+        with store.lock:
+            store.invalidate()
+            app.compute_stats_columnar(
+                app.load_column_store(conn, app.get_data_generation(conn)),
+                date.today(),
+            )
+
+    return median_ms(run)
+
+
+def print_ms(title, before, after):
+    print("%-24s %.2f ms -> %.2f ms" % (title, before, after))
+
+
+# python migrate_db.py [travel.db]
+# Переводит БД со старой схемой (даты ISO-строками, тип текстом) на
+# компактную и печатает размер файла и время /stats до и после.
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else app.DB_PATH
+    if not os.path.exists(path):
+        print("no such database: %s" % path)
+        sys.exit(1)
+
+    conn = sqlite3.connect(path)
+    if not app.has_legacy_segments(conn):
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        print("%s already uses the compact schema (user_version=%d)" % (path, version))
+        sys.exit(0)
+    size_before = db_size(path)
+    daily_before_ms = daily_from_segments_ms(conn, LEGACY_DAILY_SQL, date.fromisoformat)
+    stats_before_ms = legacy_stats_ms(conn)
+    conn.close()
+
+    app.configure_db(path)
+    started = time.perf_counter()
+    conn = app.get_db()
+    rows_before, rows_after = app.migrate_legacy_segments(conn)
+    app.release_db(conn)
+    app.init_db()
+    migrate_s = time.perf_counter() - started
+
+    conn = app.get_db()
+    conn.execute("VACUUM")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    app.release_db(conn)
+    size_after = db_size(path)
+
+    # Замеры на таком же простом соединении, как и до миграции
+    conn = sqlite3.connect(path)
+    daily_after_ms = daily_from_segments_ms(conn, COMPACT_DAILY_SQL, app.day_date)
+    stats_after_ms = stats_ms(conn)
+    conn.close()
+
+    print("%-24s %d -> %d" % ("segments", rows_before, rows_after))
+    print("%-24s %.2f s" % ("migration", migrate_s))
+    print("%-24s %.1f KB -> %.1f KB" % ("file size", size_before / 1024, size_after / 1024))
+    print_ms("daily sums from segments", daily_before_ms, daily_after_ms)
+    print_ms("/stats without cache", stats_before_ms, stats_after_ms)
@@ -0,0 +1,121 @@
+# profiling.py
+"""
+Профили отдельных запросов (cProfile) в кольцевом буфере на диске.
+
+Каждый профиль — два файла в directory: <id>.prof (pstats, открывается
+python -m pstats или snakeviz) и <id>.json с описанием запроса.
+Хранятся последние keep профилей, старые удаляются при записи нового.
+Каталог общий для всех процессов uvicorn.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import uuid
+
+# id профиля: время в нс и случайный хвост — сортируется по времени
+PROFILE_ID_RE = re.compile(r"^[0-9]{19,}-[0-9a-f]{8}$")
+
+
+class ProfileStore:
+    def __init__(self, directory, keep=50):
+        self.directory = directory
+        self.keep = keep
+        # cProfile в процессе — по одному запросу за раз (в 3.12+
+        # два профилировщика одновременно не включить)
+        self._busy = threading.Lock()
+
+    def start(self):
+        """
+        Включает профилировщик в текущем потоке. None — уже профилируется
+        другой запрос.
+        """
+        if not self._busy.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            self._busy.release()
+            return None
+        return profiler
+
+    def stop(self, profiler):
+        profiler.disable()
+        self._busy.release()
+
+    def save(self, profiler, meta):
+        """
+        Пишет профиль и описание, вытесняет самые старые. Возвращает id.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        profile_id = "%d-%s" % (time.time_ns(), uuid.uuid4().hex[:8])
+        profiler.dump_stats(self._path(profile_id, ".prof"))
+        meta = dict(meta, id=profile_id, pid=os.getpid(), created_at=time.time())
+        tmp_path = self._path(profile_id, ".json.%d.tmp" % os.getpid())
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self._path(profile_id, ".json"))
+        self._prune()
+        return profile_id
+
+    def list(self):
+        """
+        Описания профилей, новые первыми.
+        """
+        result = []
+        for profile_id in reversed(self._ids()):
+            try:
+                with open(self._path(profile_id, ".json"), "r", encoding="utf-8") as f:
+                    result.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return result
+
+    def path(self, profile_id):
+        """
+        Путь к .prof или None, если такого профиля нет.
+        """
+        if not PROFILE_ID_RE.match(profile_id):
+            return None
+        path = self._path(profile_id, ".prof")
+        return path if os.path.exists(path) else None
+
+    def text(self, profile_id, sort="cumulative", limit=50):
+        """
+        Первые limit строк pstats по sort или None.
+        """
+        path = self.path(profile_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        stats = pstats.Stats(path, stream=out)
+        stats.sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def _path(self, profile_id, suffix):
+        return os.path.join(self.directory, profile_id + suffix)
+
+    def _ids(self):
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted(
+            name[:-len(".json")] for name in names
+            if name.endswith(".json") and PROFILE_ID_RE.match(name[:-len(".json")])
+        )
+
+    def _prune(self):
+        ids = self._ids()
+        for profile_id in ids[:max(0, len(ids) - self.keep)]:
+            for suffix in (".json", ".prof"):
+                try:
+                    os.remove(self._path(profile_id, suffix))
+                except OSError:
+                    pass
@@ -0,0 +1,210 @@
+# segment_store.py
+"""
+Сегменты всех типов в памяти процесса, свёрнутые по дням.
+
+Строки — (activity, day, distance_m, duration_s, speed_kmh): id из
+activity_types, номер дня от 1970-01-01 (как в БД) и числа сегмента.
+app загружает их из SQLite при первом /stats и дописывает при импорте,
+а хранятся только плотные суммы по типам и дням (массивы [id типа,
+day - first_day]). Любой период — это срез этих массивов сразу для
+всех типов, поэтому /stats и /stats/range не зависят ни от числа
+сегментов, ни от того, сколько типов запрошено.
+"""
+
+import threading
+
+import numpy as np
+
+from aggregate import SUM_FIELDS, group_sums, speed_range
+
+
+def rows_to_columns(rows):
+    """
+    [(activity, day, distance_m, duration_s, speed_kmh), ...] -> колонки.
+    """
+    arr = np.array(rows, dtype=float).reshape(-1, 5)
+    return (arr[:, 0].astype(np.int64), arr[:, 1].astype(np.int64),
+            arr[:, 2], arr[:, 3], arr[:, 4])
+
+
+class ColumnStore:
+    """
+    generation — поколение данных БД, которому соответствует содержимое
+    (None — не загружено или устарело, нужно перечитать).
+    activity_ids — название типа -> id (строка в массивах daily).
+    size — сколько сегментов в суммах.
+    Все изменения и чтения — под lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.generation = None
+        self._reset()
+
+    def _reset(self):
+        # Память выделяется при первой записи: пустых хранилищ
+        # (по одному на пользователя) может быть много
+        self.size = 0
+        self.activity_ids = {}
+        # Диапазон скоростей для средней/максимальной, по id типа
+        self._speed_min = np.zeros(0)
+        self._speed_max = np.zeros(0)
+        self.first_day = 0
+        self.daily = {
+            name: np.zeros((0, 0), dtype=np.int64 if name == "count" else float)
+            for name in SUM_FIELDS
+        }
+
+    @property
+    def last_day(self):
+        return self.first_day + self.daily["count"].shape[1] - 1
+
+    def load(self, generation, rows, activities):
+        """
+        Заменяет содержимое строками
+        (activity, day, distance_m, duration_s, speed_kmh);
+        activities — название типа -> id.
+        """
+        with self.lock:
+            self._reset()
+            self._add_activities(activities)
+            self._append(*rows_to_columns(rows))
+            self.generation = generation
+
+    def append(self, rows, activities):
+        """
+        Дописывает новые строки. Если хранилище не загружено, ничего не
+        делает: при первом чтении они и так придут из БД.
+        """
+        with self.lock:
+            if self.generation is not None and rows:
+                self._add_activities(activities)
+                self._append(*rows_to_columns(rows))
+
+    def invalidate(self):
+        with self.lock:
+            self.generation = None
+
+    def unload(self):
+        """
+        Освобождает память; при следующем чтении всё перечитается из БД.
+        """
+        with self.lock:
+            self._reset()
+            self.generation = None
+
+    def advance(self, old, new):
+        """
+        Данные БД перешли из поколения old в new и всё новое уже
+        дописано через append. Хранилище на другом поколении не
+        меняется: app догоняет его строками новых поколений из БД.
+        """
+        with self.lock:
+            if self.generation == old:
+                self.generation = new
+
+    def _add_activities(self, activities):
+        self.activity_ids.update(activities)
+        self._grow_slots(max(self.activity_ids.values(), default=-1) + 1)
+        for name, i in activities.items():
+            self._speed_min[i], self._speed_max[i] = speed_range(name)
+
+    def _grow_slots(self, slots):
+        old_slots = len(self._speed_min)
+        if slots <= old_slots:
+            return
+        for name, old in self.daily.items():
+            new = np.zeros((slots, old.shape[1]), dtype=old.dtype)
+            new[:old_slots] = old
+            self.daily[name] = new
+        self._speed_min = np.concatenate([self._speed_min, np.zeros(slots - old_slots)])
+        self._speed_max = np.concatenate(
+            [self._speed_max, np.full(slots - old_slots, np.inf)]
+        )
+
+    def _append(self, activity, day, distance_m, duration_s, speed_kmh):
+        if not len(day):
+            return
+        self.size += len(day)
+        self._add_daily(activity, day, distance_m, duration_s, speed_kmh)
+
+    def _add_daily(self, activity, day, distance_m, duration_s, speed_kmh):
+        # id без названия — строка в daily всё равно нужна
+        self._grow_slots(int(activity.max()) + 1)
+        slots = len(self._speed_min)
+
+        lo, hi = int(day.min()), int(day.max())
+        if not self.daily["count"].shape[1]:
+            self.first_day = lo
+        lo = min(lo, self.first_day)
+        hi = max(hi, self.last_day)
+        # Диапазон дней расширился — переносим суммы в массивы побольше
+        if lo != self.first_day or hi != self.last_day:
+            offset = self.first_day - lo
+            for name, old in self.daily.items():
+                new = np.zeros((slots, hi - lo + 1), dtype=old.dtype)
+                new[:, offset:offset + old.shape[1]] = old
+                self.daily[name] = new
+            self.first_day = lo
+
+        # Группа — (тип, день), скорости — в диапазоне своего типа
+        n = hi - lo + 1
+        sums = group_sums(
+            activity * n + (day - lo), slots * n,
+            distance_m, duration_s, speed_kmh,
+            (self._speed_min[activity], self._speed_max[activity]),
+        )
+        for name in ("count", "dist_m_total", "dist_m_speed", "dur_s_speed"):
+            self.daily[name] += sums[name].reshape(slots, n)
+        np.maximum(self.daily["max_speed"], sums["max_speed"].reshape(slots, n),
+                   out=self.daily["max_speed"])
+
+    def period(self, first, last):
+        """
+        Суммы за дни first..last включительно (номера дней) сразу по
+        всем типам: SUM_FIELDS -> массив, индекс — id типа.
+        """
+        start = max(first, self.first_day) - self.first_day
+        stop = min(last, self.last_day) - self.first_day + 1
+        if stop <= start:
+            return {
+                name: np.zeros(len(values), dtype=values.dtype)
+                for name, values in self.daily.items()
+            }
+        result = {
+            name: self.daily[name][:, start:stop].sum(axis=1)
+            for name in ("count", "dist_m_total", "dist_m_speed", "dur_s_speed")
+        }
+        result["max_speed"] = self.daily["max_speed"][:, start:stop].max(axis=1)
+        return result
+
+    def daily_range(self, first, last, activity=None):
+        """
+        Плотные суммы по дням first..last включительно, дни вне данных —
+        нули. activity=None — SUM_FIELDS -> массив [id типа, день];
+        название типа — SUM_FIELDS -> массив по дням (нули, если
+        такого типа нет).
+        """
+        n = last - first + 1
+        if activity is None:
+            rows, shape = slice(None), (len(self._speed_min), n)
+        else:
+            rows, shape = self.activity_ids.get(activity), n
+        result = {
+            name: np.zeros(shape, dtype=values.dtype)
+            for name, values in self.daily.items()
+        }
+        start = max(first, self.first_day)
+        stop = min(last, self.last_day) + 1
+        if stop > start and rows is not None:
+            for name, values in self.daily.items():
+                result[name][..., start - first:stop - first] = \
+                    values[rows, start - self.first_day:stop - self.first_day]
+        return result
+
+    def activities(self):
+        """
+        Названия типов, по которым есть сегменты, по алфавиту.
+        """
+        counts = self.daily["count"].sum(axis=1)
+        return sorted(name for name, i in self.activity_ids.items() if counts[i])
@@ -0,0 +1,125 @@
+# shards.py
+"""
+Отдельный файл SQLite на каждого пользователя бота.
+
+Пользователь — id из Telegram (message.from_user.id), его сегменты,
+хэши импортов и поколение данных лежат в
+<directory>/<user_id>.db. Запросы без user_id идут в основной файл
+(travel.db), как до разделения. Так /stats и импорт одного
+пользователя не читают и не блокируют чужие данные.
+
+У каждого файла свой пул соединений и своё колоночное хранилище.
+Открытыми держатся только max_open недавних: вытесненный файл
+закрывается (пул и хранилище), при следующем запросе пользователя он
+откроется заново.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from db_pool import ConnectionPool
+from segment_store import ColumnStore
+
+# Свободных соединений на файл пользователя (у основного — как раньше)
+USER_POOL_MAX_IDLE = 2
+
+
+class Shard:
+    """
+    Файл БД одного пользователя (user_id None — основной).
+    """
+
+    def __init__(self, user_id, path, max_idle=4):
+        self.user_id = user_id
+        self.path = path
+        self.pool = ConnectionPool(path, max_idle=max_idle)
+        self.store = ColumnStore()
+
+    def close(self):
+        """
+        Закрывает пул (занятые соединения — когда их вернут) и выгружает
+        хранилище.
+        """
+        self.pool.close()
+        self.store.unload()
+
+
+class ShardRouter:
+    """
+    user_id -> Shard, не больше max_open открытых (LRU). init(shard)
+    вызывается при каждом открытии файла пользователя (создаёт схему).
+    """
+
+    def __init__(self, default_path, directory, init=None, max_open=256):
+        self.default = Shard(None, default_path)
+        self.directory = directory
+        self.init = init
+        self.max_open = max_open
+        # Открытые файлы, последний использованный — в конце
+        self._shards = OrderedDict()
+        # Файлы, которые сейчас открываются: user_id -> Future(Shard)
+        self._opening = {}
+        self._lock = threading.Lock()
+
+    def path(self, user_id):
+        return os.path.join(self.directory, "%d.db" % user_id)
+
+    def get(self, user_id, create=False):
+        """
+        Shard пользователя; None для user_id None — основной.
+        Если файла ещё нет: create=True — создаётся, иначе None.
+        """
+        if user_id is None:
+            return self.default
+
+        with self._lock:
+            shard = self._shards.get(user_id)
+            if shard is not None:
+                self._shards.move_to_end(user_id)
+                return shard
+            opening = self._opening.get(user_id)
+            if opening is None:
+                path = self.path(user_id)
+                if not create and not os.path.exists(path):
+                    return None
+                opening = self._opening[user_id] = Future()
+            else:
+                path = None
+
+        # Файл уже открывает другой поток — ждём его, а не self._lock
+        if path is None:
+            return opening.result()
+
+        # init (схема, миграция) — вне self._lock: открытие одного
+        # файла не задерживает запросы остальных пользователей
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            shard = Shard(user_id, path, max_idle=USER_POOL_MAX_IDLE)
+            if self.init is not None:
+                self.init(shard)
+        except BaseException as e:
+            with self._lock:
+                del self._opening[user_id]
+            opening.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._opening[user_id]
+            self._shards[user_id] = shard
+            evicted = []
+            while len(self._shards) > self.max_open:
+                evicted.append(self._shards.popitem(last=False)[1])
+        opening.set_result(shard)
+
+        # Вне self._lock: unload ждёт блокировку хранилища
+        for old in evicted:
+            old.close()
+        return shard
+
+    def close_all(self):
+        with self._lock:
+            shards = [self.default] + list(self._shards.values())
+        for shard in shards:
+            shard.pool.close_all()
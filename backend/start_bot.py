@@ -1,16 +1,87 @@
-import os
+import gzip
+import threading
+import time
 import telebot
 from telebot import types
-from dotenv import load_dotenv
 import requests
 
-
-load_dotenv()
-API_TOKEN = os.getenv("API_TOKEN")
+from bot_common import (
+    API_TOKEN,
+    BACKEND_URL,
+    BOT_AUTH_HEADERS,
+    WEB_APP_URL,
+    IMPORT_POLL_INTERVAL_S,
+    IMPORT_POLL_TIMEOUT_S,
+    import_result_text,
+)
+from history_stream import detect_compression
 
 
 bot = telebot.TeleBot(API_TOKEN)
 
+
+# Задачи импорта, которых ждём: job_id -> (сообщение с файлом, крайний срок)
+pending_jobs = {}
+pending_lock = threading.Lock()
+
+
+def error_text(response):
+    """
+    Ошибка бэкенда для пользователя: поле error из JSON или код ответа
+    (на 5xx прокси может вернуть HTML).
+    """
+    if response.headers.get("Content-Type", "").startswith("application/json"):
+        try:
+            return response.json().get("error") or f"HTTP {response.status_code}"
+        except ValueError:
+            pass
+    return f"HTTP {response.status_code}"
+
+
+def fetch_import_job(job_id):
+    """
+    Состояние /import/<job_id>; None — бэкенд сейчас не ответил
+    (спросим на следующем круге).
+    """
+    try:
+        response = requests.get(url=f"{BACKEND_URL}/import/{job_id}", timeout=30)
+    except requests.RequestException:
+        return None
+    if not response.ok:
+        return None
+    try:
+        return response.json()
+    except ValueError:
+        return None
+
+
+def watch_import_jobs():
+    """
+    Фоновый поток: раз в IMPORT_POLL_INTERVAL_S опрашивает все ждущие
+    задачи и отвечает на сообщение, когда импорт закончился (или за
+    IMPORT_POLL_TIMEOUT_S не дождались). Обработчики бота не ждут.
+    """
+    while True:
+        time.sleep(IMPORT_POLL_INTERVAL_S)
+        with pending_lock:
+            jobs = list(pending_jobs.items())
+        for job_id, (message, deadline) in jobs:
+            job = fetch_import_job(job_id)
+            if job is not None and job["state"] in ("done", "failed"):
+                text = import_result_text(job)
+            elif time.monotonic() > deadline:
+                text = import_result_text(None)
+            else:
+                continue
+            with pending_lock:
+                pending_jobs.pop(job_id, None)
+            try:
+                bot.reply_to(message, text)
+            except Exception:
+                # Telegram недоступен — ответ потерян, поток живёт дальше
+                pass
+
+
 @bot.message_handler(content_types=['document'])
 def handle_docs(message):
     # получаем file_id
@@ -21,19 +92,36 @@ def handle_docs(message):
 
     # скачиваем файл
     downloaded_file = bot.download_file(file_info.file_path)
-    headers = {"Content-Type": "application/json"}
-    
-    response = requests.post(url='http://127.0.0.1:5000/import', data=downloaded_file, headers=headers, timeout=30)
-    # if response.status_code == ''
+    headers = {"Content-Type": "application/json", **BOT_AUTH_HEADERS}
+
+    # несжатый JSON жмём gzip: бэкенд распакует, а передаётся в ~10 раз меньше
+    if detect_compression(downloaded_file[:4]) is None:
+        downloaded_file = gzip.compress(downloaded_file)
+        headers["Content-Encoding"] = "gzip"
 
-    bot.reply_to(message, "Файл получен!")
+    # бэкенд только сохраняет файл и ставит импорт в очередь;
+    # сегменты каждого пользователя лежат в своём файле БД
+    params = {"user_id": message.from_user.id}
+    response = requests.post(url=f"{BACKEND_URL}/import", params=params, data=downloaded_file, headers=headers, timeout=30)
+    if response.status_code != 202:
+        bot.reply_to(message, f"Не удалось отправить файл: {error_text(response)}")
+        return
+
+    bot.reply_to(message, "Файл получен! Импортирую...")
+
+    # Результат пришлёт watch_import_jobs, обработчик сразу освобождается
+    with pending_lock:
+        pending_jobs[response.json()["job_id"]] = (
+            message, time.monotonic() + IMPORT_POLL_TIMEOUT_S
+        )
 
 @bot.message_handler(commands=['start'])
 def start(message):
-    web_app = types.WebAppInfo(url="https://acea3d9fe53b.ngrok-free.app")  # ссылка на ваш Web App
+    web_app = types.WebAppInfo(url=WEB_APP_URL)
     btn = types.MenuButtonWebApp("web_app", text="Открыть WebApp", web_app=web_app)
-    
+
     bot.set_chat_menu_button(chat_id=None, menu_button=btn)
     bot.send_message(message.chat.id, "Добро пожаловать! Нажмите на кнопку ниже, чтобы открыть WebApp.")
 
+threading.Thread(target=watch_import_jobs, name="import-jobs", daemon=True).start()
 bot.infinity_polling(5)
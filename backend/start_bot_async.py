@@ -0,0 +1,155 @@
+import asyncio
+import zlib
+
+import aiohttp
+from telebot import types
+from telebot.async_telebot import AsyncTeleBot
+
+from bot_common import (
+    API_TOKEN,
+    BACKEND_URL,
+    BOT_AUTH_HEADERS,
+    WEB_APP_URL,
+    IMPORT_POLL_INTERVAL_S,
+    IMPORT_POLL_TIMEOUT_S,
+    import_result_text,
+)
+from history_stream import detect_compression
+
+# Асинхронный вариант start_bot.py: каждый документ обрабатывается
+# в своей задаче, файл из Telegram не собирается в памяти, а кусками
+# уходит прямо в /import бэкенда (несжатый JSON — сразу через gzip).
+
+STREAM_CHUNK_SIZE = 64 * 1024
+HTTP_POOL_SIZE = 32
+
+
+bot = AsyncTeleBot(API_TOKEN)
+
+# Общая сессия с пулом соединений (создаётся в main)
+http = None
+
+
+async def read_json(response):
+    """
+    JSON ответа бэкенда; None — ответ не JSON (на 5xx прокси может
+    вернуть HTML).
+    """
+    if response.content_type != "application/json":
+        return None
+    try:
+        return await response.json()
+    except ValueError:
+        return None
+
+
+async def wait_import_job(job_id):
+    """
+    Опрашивает /import/<job_id>, пока импорт не закончится.
+    None — не дождались. Если бэкенд не ответил, спросим на следующем
+    круге.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + IMPORT_POLL_TIMEOUT_S
+    while loop.time() < deadline:
+        await asyncio.sleep(IMPORT_POLL_INTERVAL_S)
+        try:
+            async with http.get(f"{BACKEND_URL}/import/{job_id}") as response:
+                job = await read_json(response) if response.ok else None
+        except aiohttp.ClientError:
+            continue
+        if job is not None and job["state"] in ("done", "failed"):
+            return job
+    return None
+
+
+async def gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def prepend(first, chunks):
+    yield first
+    async for chunk in chunks:
+        yield chunk
+
+
+async def upload_body(download):
+    """
+    Тело запроса в /import и его Content-Encoding. Уже сжатые файлы
+    (zip, gzip, zstd) идут как есть, обычный JSON сжимается gzip на лету.
+    """
+    chunks = download.content.iter_chunked(STREAM_CHUNK_SIZE)
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        return b"", None
+
+    body = prepend(first, chunks)
+    if detect_compression(first[:4]) is None:
+        return gzip_chunks(body), "gzip"
+    return body, None
+
+
+async def forward_to_backend(file_url, user_id):
+    """
+    Скачивает файл из Telegram и одновременно отправляет его в /import
+    пользователя user_id, не буферизуя целиком.
+    Возвращает (status, json ответа или None).
+    """
+    async with http.get(file_url) as download:
+        download.raise_for_status()
+        body, encoding = await upload_body(download)
+        headers = {"Content-Type": "application/json", **BOT_AUTH_HEADERS}
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        async with http.post(
+            f"{BACKEND_URL}/import",
+            params={"user_id": user_id},
+            data=body,
+            headers=headers,
+        ) as response:
+            return response.status, await read_json(response)
+
+
+@bot.message_handler(content_types=['document'])
+async def handle_docs(message):
+    file_url = await bot.get_file_url(message.document.file_id)
+
+    status, body = await forward_to_backend(file_url, message.from_user.id)
+    if status != 202 or body is None:
+        error = (body or {}).get("error") or f"HTTP {status}"
+        await bot.reply_to(message, f"Не удалось отправить файл: {error}")
+        return
+
+    await bot.reply_to(message, "Файл получен! Импортирую...")
+
+    job = await wait_import_job(body["job_id"])
+    await bot.reply_to(message, import_result_text(job))
+
+
+@bot.message_handler(commands=['start'])
+async def start(message):
+    web_app = types.WebAppInfo(url=WEB_APP_URL)
+    btn = types.MenuButtonWebApp("web_app", text="Открыть WebApp", web_app=web_app)
+
+    await bot.set_chat_menu_button(chat_id=None, menu_button=btn)
+    await bot.send_message(message.chat.id, "Добро пожаловать! Нажмите на кнопку ниже, чтобы открыть WebApp.")
+
+
+async def main():
+    global http
+    connector = aiohttp.TCPConnector(limit=HTTP_POOL_SIZE)
+    # Общего таймаута нет: большой файл может идти долго
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=300)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        http = session
+        await bot.infinity_polling(5)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
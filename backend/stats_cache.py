@@ -0,0 +1,127 @@
+# stats_cache.py
+"""
+Кэш готовых ответов /stats.
+
+Ключ — (base_date, data_generation, activity, user_id). Поколение данных
+растёт с каждой пачкой импорта, которая что-то добавила, поэтому старые ключи
+просто перестают запрашиваться и вытесняются — явная инвалидация не нужна.
+Поколения у каждого файла БД (пользователя) свои.
+"""
+
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+class StatsCache:
+    """
+    LRU в памяти процесса.
+    """
+
+    def __init__(self, max_entries=128):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DiskStatsCache(StatsCache):
+    """
+    LRU в памяти + JSON-файлы в directory/<user_id или main>:
+    переживает перезапуск и общий для нескольких процессов. Файлы
+    прошлых поколений пользователя удаляются при первой записи нового;
+    более новые (их мог записать процесс, который уже видит следующее
+    поколение) не трогаются.
+    """
+
+    def __init__(self, directory, max_entries=128):
+        super().__init__(max_entries)
+        self.directory = directory
+        self._generations = {}
+        os.makedirs(directory, exist_ok=True)
+
+    def _user_dir(self, user_id):
+        return os.path.join(
+            self.directory, "main" if user_id is None else str(user_id)
+        )
+
+    def _path(self, key):
+        base_date, generation, activity, user_id = key
+        # activity приходит из запроса — в имени файла только hex
+        return os.path.join(
+            self._user_dir(user_id), "%d-%s-%s.json" % (
+                generation, base_date.isoformat(), activity.encode().hex()
+            )
+        )
+
+    def get(self, key):
+        value = super().get(key)
+        if value is not None:
+            return value
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        super().put(key, value)
+        return value
+
+    def put(self, key, value):
+        super().put(key, value)
+        generation, user_id = key[1], key[3]
+        if generation != self._generations.get(user_id):
+            self._generations[user_id] = generation
+            os.makedirs(self._user_dir(user_id), exist_ok=True)
+            self._prune(self._user_dir(user_id), generation)
+
+        path = self._path(key)
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(value, f)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass
+
+    def _prune(self, directory, generation):
+        for name in os.listdir(directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                older = int(name.split("-", 1)[0]) < generation
+            except ValueError:
+                older = False
+            if older:
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+
+
+def make_stats_cache():
+    """
+    STATS_CACHE_DIR в окружении включает дисковый вариант.
+    """
+    directory = os.getenv("STATS_CACHE_DIR")
+    size = int(os.getenv("STATS_CACHE_SIZE", "128"))
+    if directory:
+        return DiskStatsCache(directory, size)
+    return StatsCache(size)
@@ -0,0 +1,48 @@
+# telegram_auth.py
+"""
+Проверка initData Telegram Web App.
+
+Web App получает от Telegram строку initData (query string с полями
+user, auth_date, hash и др.) и отправляет её в заголовке запроса.
+hash — HMAC-SHA256 остальных полей, ключ выводится из токена бота,
+поэтому подделать id пользователя без токена нельзя:
+https://core.telegram.org/bots/webapps#validating-data-received-via-the-mini-app
+"""
+
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import parse_qsl
+
+
+def init_data_user_id(init_data, bot_token, max_age_s, now=None):
+    """
+    id пользователя из initData, если подпись сделана токеном bot_token
+    и auth_date не старше max_age_s секунд; иначе None.
+    """
+    if not bot_token:
+        return None
+    try:
+        fields = dict(parse_qsl(init_data, keep_blank_values=True, strict_parsing=True))
+    except ValueError:
+        return None
+    received = fields.pop("hash", None)
+    if received is None:
+        return None
+
+    # Строка для проверки: остальные поля "ключ=значение" по алфавиту
+    check_string = "\n".join("%s=%s" % item for item in sorted(fields.items()))
+    secret = hmac.new(b"WebAppData", bot_token.encode(), hashlib.sha256).digest()
+    expected = hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(expected.encode(), received.encode()):
+        return None
+
+    try:
+        auth_date = int(fields["auth_date"])
+        user_id = int(json.loads(fields["user"])["id"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    if (now if now is not None else time.time()) - auth_date > max_age_s:
+        return None
+    return user_id if user_id > 0 else None
@@ -0,0 +1,5 @@
+# Модули backend импортируются по имени (import app), как в bench/
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
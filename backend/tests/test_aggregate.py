@@ -0,0 +1,39 @@
+"""
+aggregate(): календарные корзины за один проход совпадают с fold_days
+по дневным суммам ColumnStore, час суток — по start_ts со сдвигом.
+"""
+
+import numpy as np
+
+from aggregate import GRANULARITIES, aggregate, fold_days, segment_columns
+from bench.synthetic import segment_rows
+from segment_store import ColumnStore
+
+
+def test_one_pass_matches_store():
+    rows = segment_rows(years=2, per_day=3)
+    store = ColumnStore()
+    store.load(0, [(0, r[2], r[4], r[5], r[6]) for r in rows], {"cycling": 0})
+    days = (store.first_day, store.last_day)
+    daily = store.daily_range(*days, "cycling")
+
+    columns = segment_columns([(r[2], r[0], r[4], r[5], r[6]) for r in rows])
+    result = aggregate(columns, GRANULARITIES, 3600, days)
+    for g in ("day", "week", "month", "year"):
+        expected = fold_days(days[0], daily, g)
+        assert result[g].labels == expected.labels
+        np.testing.assert_allclose(result[g].dist_m_total, expected.dist_m_total)
+        np.testing.assert_allclose(result[g].max_speed, expected.max_speed)
+
+    hour = result["hour"]
+    assert hour.labels == list(range(24))
+    assert hour.count.sum() == len(rows)
+    np.testing.assert_allclose(hour.dist_m_total.sum(), columns.distance_m.sum())
+
+
+def test_hour_uses_offset():
+    # 23:30 UTC — 00:30 при сдвиге +1 час
+    ts = 19000 * 86400 + 23 * 3600 + 1800
+    columns = segment_columns([(19000, ts, 1000.0, 300.0, 12.0)])
+    assert aggregate(columns, ("hour",))["hour"].nonempty().labels == [23]
+    assert aggregate(columns, ("hour",), 3600)["hour"].nonempty().labels == [0]
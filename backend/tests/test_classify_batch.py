@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+import app
+import classify_batch
+import geo
+from bench.classify import random_segments, run_batch, run_scalar
+from constants import BIKE_PRIORITY_LOCATIONS
+
+
+def use_bus_stops(monkeypatch, stops):
+    index = geo.LocationIndex(stops, geo.BUS_RADIUS_M)
+    monkeypatch.setattr(app, "BUS_STOPS", stops)
+    monkeypatch.setattr(app, "BUS_STOPS_INDEX", index)
+    monkeypatch.setattr(classify_batch, "BUS_STOPS", stops)
+    monkeypatch.setattr(classify_batch, "BUS_STOPS_INDEX", index)
+    monkeypatch.setattr(classify_batch, "BUS_POINTS", classify_batch._points(stops))
+
+
+def near_stops():
+    return [
+        {"name": "stop_%d" % i, "lat": c["lat"] + 0.0004, "lon": c["lon"]}
+        for i, c in enumerate(BIKE_PRIORITY_LOCATIONS)
+    ]
+
+
+def many_stops():
+    # Много остановок — пакетный путь уходит в LocationIndex
+    rnd = random.Random(2)
+    return [
+        {"name": "stop_%d" % i,
+         "lat": 47.54 + rnd.uniform(0, 0.03),
+         "lon": 9.68 + rnd.uniform(0, 0.05)}
+        for i in range(500)
+    ]
+
+
+@pytest.mark.parametrize("stops", [None, near_stops, many_stops])
+def test_batch_matches_scalar(monkeypatch, stops):
+    if stops is not None:
+        use_bus_stops(monkeypatch, stops())
+    segments = random_segments(5000)
+    assert run_batch(segments) == run_scalar(segments)
+
+
+def test_empty_batch():
+    assert classify_batch.classify_activity_batch([], [], [], [], [], []) == []
@@ -0,0 +1,41 @@
+import io
+import json
+
+import pytest
+
+from history_stream import iter_events
+
+EVENTS = [
+    {
+        "startTime": "2024-05-01T08:00:00.000+02:00",
+        "activity": {"distanceMeters": 15000000000.0, "probability": -2.5e-3},
+    },
+    {"visit": {"hierarchyLevel": 0, "nested": [[1, 2.0], {"x": [-1E+2, 3e5]}]}},
+    [1234567890123, -0.000001, 6.02E23, True, False, None, "a\\\"b"],
+    12345678901234567890,
+    -7.5,
+    "строка с \"кавычками\" и \\",
+]
+
+DOCUMENTS = [
+    json.dumps(EVENTS),
+    json.dumps(EVENTS, indent=1),
+    # Незнакомые ключи обёртки пропускаются, не разбираясь
+    json.dumps({"meta": {"n": 1.5e10, "list": EVENTS}, "n": 2e-7, "events": EVENTS}),
+    json.dumps({"timelineObjects": EVENTS, "tail": [3.25, {"k": -1}]}),
+]
+
+
+@pytest.mark.parametrize("doc", DOCUMENTS)
+def test_every_chunk_boundary(doc):
+    data = doc.encode("utf-8")
+    loaded = json.loads(doc)
+    expected = loaded if isinstance(loaded, list) else (
+        loaded.get("events") or loaded.get("timelineObjects")
+    )
+    for chunk_size in range(1, len(data) + 1):
+        assert list(iter_events(io.BytesIO(data), chunk_size=chunk_size)) == expected, chunk_size
+
+
+def test_number_cut_after_dot():
+    assert list(iter_events(io.BytesIO(b"[15000000000.0]"), chunk_size=13)) == [15000000000.0]
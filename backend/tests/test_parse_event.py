@@ -0,0 +1,42 @@
+"""
+parse_event: секунды epoch совпадают с тем, что даёт миграция старой
+схемы в SQLite (strftime('%s')), в том числе для времени без смещения.
+"""
+
+import sqlite3
+
+import pytest
+
+from app import parse_event
+
+
+def event(start, end):
+    return {
+        "startTime": start,
+        "endTime": end,
+        "activity": {"distanceMeters": "1200", "topCandidate": {"type": "cycling"}},
+    }
+
+
+@pytest.mark.parametrize("start, end", [
+    ("2024-11-20T11:24:00.449+01:00", "2024-11-20T11:30:00.000+01:00"),
+    ("2024-11-20T11:24:00", "2024-11-20T11:30:00"),
+])
+def test_timestamps_match_sqlite(start, end):
+    row = parse_event(event(start, end))
+    conn = sqlite3.connect(":memory:")
+    expected = conn.execute(
+        "SELECT CAST(strftime('%s', ?) AS INTEGER),"
+        " CAST(strftime('%s', ?) AS INTEGER)",
+        (start, end),
+    ).fetchone()
+    assert row[:2] == expected
+
+
+@pytest.mark.parametrize("start, end", [
+    ("0001-01-01T10:00:00Z", "0001-01-01T10:30:00Z"),
+    ("1999-12-31T10:00:00+01:00", "1999-12-31T10:30:00+01:00"),
+    ("9999-12-31T10:00:00Z", "9999-12-31T10:30:00Z"),
+])
+def test_implausible_dates_rejected(start, end):
+    assert parse_event(event(start, end)) is None
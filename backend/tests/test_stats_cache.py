@@ -0,0 +1,23 @@
+"""
+DiskStatsCache: файлы более новых поколений (их пишут другие процессы)
+не удаляются при записи старого.
+"""
+
+import os
+from datetime import date
+
+from stats_cache import DiskStatsCache
+
+
+def test_prune_keeps_newer_generations(tmp_path):
+    day = date(2024, 5, 1)
+    newer = DiskStatsCache(str(tmp_path))
+    newer.put((day, 7, "cycling", None), {"v": 7})
+
+    older = DiskStatsCache(str(tmp_path))
+    older.put((day, 5, "cycling", None), {"v": 5})
+    older.put((day, 6, "cycling", None), {"v": 6})
+
+    names = sorted(os.listdir(tmp_path / "main"))
+    assert [name.split("-", 1)[0] for name in names] == ["6", "7"]
+    assert DiskStatsCache(str(tmp_path)).get((day, 7, "cycling", None)) == {"v": 7}
@@ -0,0 +1,70 @@
+"""
+Колоночное хранилище после записей — своих (с дубликатами в пачке)
+и другого процесса — совпадает с загруженным из БД заново.
+"""
+
+import numpy as np
+import pytest
+
+import app
+from bench.synthetic import segment_rows
+from shards import Shard
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = app.DB_PATH
+    app.configure_db(str(tmp_path / "travel.db"))
+    app.init_db()
+    yield app.shards.default
+    app.configure_db(path)
+
+
+def loaded(shard, conn):
+    return app.load_column_store(conn, app.get_data_generation(conn), shard)
+
+
+def assert_same_as_fresh(shard, conn):
+    fresh = Shard(None, shard.path)
+    expected = loaded(fresh, conn)
+    store = loaded(shard, conn)
+    assert store.size == expected.size
+    assert store.first_day == expected.first_day
+    for name, values in expected.daily.items():
+        np.testing.assert_allclose(store.daily[name], values)
+    fresh.close()
+
+
+def test_duplicates_in_batch_keep_store_loaded(db):
+    rows = segment_rows(years=1)
+    conn = db.pool.acquire()
+    app.write_segments(conn, rows[:500], shard=db)
+    store = loaded(db, conn)
+
+    inserted = app.write_segments(conn, rows[250:1000], shard=db)
+    assert inserted == 500
+    assert store.generation == app.get_data_generation(conn)
+    assert_same_as_fresh(db, conn)
+    db.pool.release(conn)
+
+
+def test_other_process_writes_are_appended(db, monkeypatch):
+    rows = segment_rows(years=1)
+    conn = db.pool.acquire()
+    app.write_segments(conn, rows[:500], shard=db)
+    loaded(db, conn)
+
+    # Другой процесс: своё соединение и своё хранилище
+    other = Shard(None, db.path)
+    other_conn = other.pool.acquire()
+    app.write_segments(other_conn, rows[400:800], shard=other)
+    app.write_segments(other_conn, rows[800:], shard=other)
+    other.pool.release(other_conn)
+    other.close()
+
+    # Догоняет только новые поколения, без полной перезагрузки
+    calls = []
+    monkeypatch.setattr(db.store, "load", lambda *a: calls.append(a))
+    assert_same_as_fresh(db, conn)
+    assert not calls
+    db.pool.release(conn)
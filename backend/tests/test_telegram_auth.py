@@ -0,0 +1,77 @@
+"""
+initData Web App: id пользователя только при верной подписи токеном
+бота; ?user_id= — только с токеном бота в X-Bot-Token.
+"""
+
+import hashlib
+import hmac
+import json
+import time
+from urllib.parse import urlencode
+
+import pytest
+
+import app
+from telegram_auth import init_data_user_id
+
+TOKEN = "123456:TEST"
+
+
+def sign(fields, token=TOKEN):
+    check_string = "\n".join("%s=%s" % item for item in sorted(fields.items()))
+    secret = hmac.new(b"WebAppData", token.encode(), hashlib.sha256).digest()
+    digest = hmac.new(secret, check_string.encode(), hashlib.sha256).hexdigest()
+    return urlencode(dict(fields, hash=digest))
+
+
+def fields(user_id=42, auth_date=None):
+    return {
+        "query_id": "AAF",
+        "user": json.dumps({"id": user_id, "first_name": "Test"}),
+        "auth_date": str(int(auth_date or time.time())),
+    }
+
+
+def test_valid_init_data():
+    assert init_data_user_id(sign(fields()), TOKEN, 3600) == 42
+
+
+@pytest.mark.parametrize("init_data", [
+    sign(fields(), token="654321:OTHER"),
+    sign(fields()).replace("42", "43"),
+    sign(fields(auth_date=time.time() - 7200)),
+    urlencode(fields()),
+    "not a query string",
+])
+def test_rejected_init_data(init_data):
+    assert init_data_user_id(init_data, TOKEN, 3600) is None
+
+
+def test_no_bot_token():
+    assert init_data_user_id(sign(fields()), None, 3600) is None
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    path = app.DB_PATH
+    app.configure_db(str(tmp_path / "travel.db"))
+    app.init_db()
+    monkeypatch.setattr(app, "BOT_TOKEN", TOKEN)
+    app.shards.get(42, create=True)
+    yield app.app.test_client()
+    app.configure_db(path)
+
+
+def test_select_shard(client):
+    bot = {"X-Bot-Token": TOKEN}
+    assert client.get("/stats?user_id=42").status_code == 403
+    assert client.get("/stats?user_id=42", headers={"X-Bot-Token": "x"}).status_code == 403
+    assert client.get("/stats?user_id=42", headers=bot).status_code == 200
+    assert client.get("/stats?user_id=7", headers=bot).status_code == 404
+
+    webapp = {"X-Telegram-Init-Data": sign(fields())}
+    assert client.get("/stats", headers=webapp).status_code == 200
+    forged = {"X-Telegram-Init-Data": sign(fields(), token="654321:OTHER")}
+    assert client.get("/stats", headers=forged).status_code == 401
+    # Чужой user_id в запросе не подменяет пользователя из initData
+    assert client.get("/stats?user_id=7", headers=webapp).status_code == 200
@@ -1,5 +1,13 @@
 /// <reference types="vite/client" />
 
+interface Window {
+  Telegram?: {
+    WebApp?: {
+      initData: string
+    }
+  }
+}
+
 declare module "*.vue" {
   import { DefineComponent } from "vue";
   const component: DefineComponent<{}, {}, any>;
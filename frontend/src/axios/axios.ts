@@ -1,10 +1,15 @@
 import axios from "axios";
 const BASE_URL = import.meta.env.VITE_BASE_BACKEND_URL
 
+// Подписанные Telegram данные Web App: по ним бэкенд узнаёт пользователя
+// (вне Telegram строка пустая — тогда данные из основного файла БД)
+const INIT_DATA = window.Telegram?.WebApp?.initData
+
 
 export const apiClient = axios.create({
   baseURL: BASE_URL,
   headers: {
     'Content-Type': 'application/json',
+    ...(INIT_DATA ? { 'X-Telegram-Init-Data': INIT_DATA } : {}),
   },
 });
\ No newline at end of file